@@ -1,5 +1,5 @@
 
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, UpdateMany, ReplaceOne, DeleteMany
 from pymongo.errors import ConnectionFailure, OperationFailure
 
 from paper_trading.utility.model import DBData
@@ -47,12 +47,26 @@ class MongoDBService():
             raise OperationFailure("MongoDB数据库查询数据失败")
 
     def on_select(self, pt_db: DBData):
-        """数据库查询操作"""
+        """
+        数据库查询操作
+        raw_data中可选projection(字段列表)、sort、limit、batch_size参数
+        """
         try:
             db = self.db_client[pt_db.db_name]
             cl = db[pt_db.db_cl]
             flt = pt_db.raw_data['flt']
-            result = cl.find(flt)
+            projection = pt_db.raw_data.get('projection')
+            if projection:
+                projection = dict.fromkeys(projection, 1)
+                projection['_id'] = 0
+            result = cl.find(flt, projection)
+
+            if pt_db.raw_data.get('sort'):
+                result = result.sort(pt_db.raw_data['sort'])
+            if pt_db.raw_data.get('limit'):
+                result = result.limit(pt_db.raw_data['limit'])
+            if pt_db.raw_data.get('batch_size'):
+                result = result.batch_size(pt_db.raw_data['batch_size'])
 
             return result
         except:
@@ -106,6 +120,37 @@ class MongoDBService():
         except:
             raise OperationFailure("MongoDB数据库更新数据失败")
 
+    def on_bulk_write(self, pt_db: DBData):
+        """
+        批量写入操作
+        raw_data中可选update(单条更新的(flt, set)列表)、update_many(多条更新的(flt, set)列表)、
+        replace(不存在时插入的(flt, data)列表)、delete(删除的flt列表)参数，所有操作一次提交
+        """
+        try:
+            db = self.db_client[pt_db.db_name]
+            cl = db[pt_db.db_cl]
+            requests = [UpdateOne(flt, set_) for flt, set_ in pt_db.raw_data.get('update', [])]
+            requests += [UpdateMany(flt, set_) for flt, set_ in pt_db.raw_data.get('update_many', [])]
+            requests += [ReplaceOne(flt, data.__dict__, upsert=True)
+                         for flt, data in pt_db.raw_data.get('replace', [])]
+            requests += [DeleteMany(flt) for flt in pt_db.raw_data.get('delete', [])]
+            if requests:
+                cl.bulk_write(requests, ordered=False)
+            return True
+        except:
+            raise OperationFailure("MongoDB数据库批量写入数据失败")
+
+    def on_create_index(self, pt_db: DBData):
+        """创建索引"""
+        try:
+            db = self.db_client[pt_db.db_name]
+            cl = db[pt_db.db_cl]
+            for keys in pt_db.raw_data['index']:
+                cl.create_index(keys)
+            return True
+        except:
+            raise OperationFailure("MongoDB数据库创建索引失败")
+
     def on_delete(self, pt_db: DBData):
         """数据库删除操作"""
         try:
@@ -131,6 +176,25 @@ class MongoDBService():
         except:
             raise OperationFailure("MongoDB数据库分组查询数据失败")
 
+    def on_union_select(self, pt_db: DBData):
+        """跨集合联合查询，将多个集合的查询结果合并到一个游标中"""
+        try:
+            db = self.db_client[pt_db.db_name]
+            cls = pt_db.raw_data['cls']
+            flt = pt_db.raw_data['flt']
+            if not cls:
+                return []
+
+            pipeline = [{'$match': flt}]
+            for cl in cls[1:]:
+                pipeline.append({'$unionWith': {'coll': cl, 'pipeline': [{'$match': flt}]}})
+            pipeline.append({'$project': {'_id': 0}})
+            result = db[cls[0]].aggregate(pipeline, allowDiskUse=True)
+
+            return result
+        except:
+            raise OperationFailure("MongoDB数据库联合查询数据失败")
+
     def on_collections_query(self, pt_db: DBData):
         """获取集合列表"""
         try:
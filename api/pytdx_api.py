@@ -10,6 +10,36 @@ from pytdx.pool.ippool import AvailableIPPool
 exchange_map = {}
 exchange_map["SH"] = 1
 exchange_map["SZ"] = 0
+market_map = {v: k for k, v in exchange_map.items()}
+
+# 单次行情请求的最大证券数量
+QUOTES_BATCH = 80
+
+# 价格字段，通达信基金数据是实际价格的10倍
+PRICE_FIELDS = [
+    "price",
+    "last_close",
+    "open",
+    "high",
+    "low",
+    "ask1",
+    "bid1",
+    "ask2",
+    "bid2",
+    "ask3",
+    "bid3",
+    "ask4",
+    "bid4",
+    "ask5",
+    "bid5",
+]
+
+
+def close_price_dict(df: pd.DataFrame):
+    """由批量行情数据生成{证券代码: 最新价格}"""
+    if not len(df):
+        return dict()
+    return dict(zip(df["pt_symbol"], df["price"].astype(float).round(5)))
 
 
 class PYTDXService:
@@ -53,28 +83,56 @@ class PYTDXService:
             )
             # 处理基金价格：通达信基金数据是实际价格的10倍
             if data["decimal_point"] == 3:
-                for val in [
-                    "price",
-                    "last_close",
-                    "open",
-                    "high",
-                    "low",
-                    "ask1",
-                    "bid1",
-                    "ask2",
-                    "bid2",
-                    "ask3",
-                    "bid3",
-                    "ask4",
-                    "bid4",
-                    "ask5",
-                    "bid5",
-                ]:
+                for val in PRICE_FIELDS:
                     df[val] = df[val] / 10
             return df
         except Exception:
             raise ValueError("股票数据获取失败")
 
+    def get_realtime_data_batch(self, symbols: list):
+        """
+        批量获取股票实时数据
+        每次请求最多QUOTES_BATCH个证券，证券信息一次查询
+        :return: 每个证券一行的dataframe，pt_symbol列为证券代码
+        """
+        try:
+            req = [self.generate_symbols(symbol)[0] for symbol in symbols]
+            if not req:
+                return pd.DataFrame()
+
+            data_list = []
+            for i in range(0, len(req), QUOTES_BATCH):
+                data = self.hq_api.get_security_quotes(req[i:i + QUOTES_BATCH])
+                if data:
+                    data_list.extend(data)
+            df = self.hq_api.to_df(data_list)
+            if not len(df):
+                return df
+            df["pt_symbol"] = df["code"] + "." + df["market"].map(market_map)
+
+            # 处理基金价格：通达信基金数据是实际价格的10倍
+            cursor = self.client["stocks"]["security"].find(
+                {"$or": [{"code": code, "market": str(market)} for market, code in req]},
+                {"code": 1, "market": 1, "decimal_point": 1, "_id": 0}
+            )
+            funds = {
+                d["code"] + "." + market_map[int(d["market"])]
+                for d in cursor if d.get("decimal_point") == 3
+            }
+            if funds:
+                is_fund = df["pt_symbol"].isin(funds)
+                df.loc[is_fund, PRICE_FIELDS] = df.loc[is_fund, PRICE_FIELDS] / 10
+            return df
+        except Exception:
+            raise ValueError("股票数据获取失败")
+
+    def get_close_prices(self, symbols):
+        """
+        批量获取收盘价格
+        :return: {证券代码: 最新价格}
+        """
+        return close_price_dict(self.get_realtime_data_batch(list(symbols)))
+
     def get_history_transaction_data(self, symbol, date):
         """
         查询历史分笔数据
@@ -0,0 +1,207 @@
+
+import os
+import time
+from datetime import datetime
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+
+from paper_trading.api.pytdx_api import exchange_map, close_price_dict
+
+# 录制的行情字段
+QUOTE_FIELDS = ["price", "last_close", "open", "high", "low", "vol", "amount"]
+for i in range(1, 6):
+    QUOTE_FIELDS.extend([f"ask{i}", f"bid{i}", f"ask_vol{i}", f"bid_vol{i}"])
+
+# 行情文件的记录格式，ts为行情查询时的时间戳
+QUOTE_DTYPE = np.dtype([("ts", "f8")] + [(f, "f8") for f in QUOTE_FIELDS])
+
+
+def quote_path(root: str, date: str, symbol: str = None):
+    """行情文件路径，每个交易日一个目录，每个证券一个文件"""
+    if symbol:
+        return os.path.join(root, date, f"{symbol}.bin")
+    return os.path.join(root, date)
+
+
+class QuoteRecorder:
+    """
+    行情录制
+    将查询到的行情快照按证券追加到当日的行情文件中，文件为定长记录，可以直接用numpy.memmap读取
+    """
+
+    def __init__(self, root: str):
+        self.root = root                # 行情文件目录
+        self._date = None               # 当前写入的日期
+        self._files = dict()            # 打开的行情文件
+        self._lock = Lock()
+
+    def record(self, df: pd.DataFrame):
+        """
+        录制行情
+        :param df: 行情源返回的dataframe，pt_symbol列为证券代码
+        """
+        if not len(df):
+            return
+
+        now = time.time()
+        data = np.zeros(len(df), dtype=QUOTE_DTYPE)
+        data["ts"] = now
+        for f in QUOTE_FIELDS:
+            if f in df.columns:
+                data[f] = df[f].values.astype(float)
+
+        date = datetime.fromtimestamp(now).strftime("%Y%m%d")
+        with self._lock:
+            if date != self._date:
+                self._close_files()
+                os.makedirs(quote_path(self.root, date), exist_ok=True)
+                self._date = date
+
+            for symbol, row in zip(df["pt_symbol"], data):
+                f = self._files.get(symbol)
+                if f is None:
+                    # 不使用缓冲，程序意外退出时不会丢失已查询的行情
+                    f = self._files[symbol] = open(quote_path(self.root, date, symbol), "ab", buffering=0)
+                f.write(row.tobytes())
+
+    def _close_files(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+    def close(self):
+        """关闭行情文件"""
+        with self._lock:
+            self._close_files()
+
+
+class RecordedQuoteService:
+    """
+    录制行情的行情源
+    包装实际的行情源，查询到的所有行情快照写入行情文件
+    """
+
+    def __init__(self, hq_client, recorder: QuoteRecorder):
+        self.hq_client = hq_client      # 实际的行情源
+        self.recorder = recorder        # 行情录制
+
+    def __getattr__(self, name):
+        return getattr(self.hq_client, name)
+
+    def get_realtime_data(self, symbol: str):
+        """获取股票实时数据"""
+        df = self.hq_client.get_realtime_data(symbol)
+        if len(df):
+            self.recorder.record(df.assign(pt_symbol=symbol))
+        return df
+
+    def get_realtime_data_batch(self, symbols: list):
+        """批量获取股票实时数据"""
+        df = self.hq_client.get_realtime_data_batch(symbols)
+        self.recorder.record(df)
+        return df
+
+    def get_close_prices(self, symbols):
+        """批量获取收盘价格"""
+        return close_price_dict(self.get_realtime_data_batch(list(symbols)))
+
+
+class ReplayQuoteService:
+    """
+    回放行情源
+    读取录制的行情文件，按回放时钟返回不晚于当前回放时间的最新行情快照，接口与PYTDXService一致，
+    回放时钟从录制的第一条行情开始，按speed倍速前进，交易市场使用now()作为当前时间
+    """
+
+    def __init__(self, root: str, date: str, speed: float = 1, start: str = None):
+        """
+        构造函数
+        :param root: 行情文件目录
+        :param date: 回放的交易日，格式为YYYYMMDD
+        :param speed: 回放倍速
+        :param start: 回放开始时间，格式为HHMMSS，默认从第一条行情开始
+        """
+        self.connected = False
+        self.speed = speed
+        self.data = dict()              # {证券代码: 行情记录数组}
+
+        path = quote_path(root, date)
+        if not os.path.isdir(path):
+            raise ValueError(f"没有{date}的行情文件")
+
+        for name in os.listdir(path):
+            if not name.endswith(".bin") or not os.path.getsize(os.path.join(path, name)):
+                continue
+            data = np.memmap(os.path.join(path, name), dtype=QUOTE_DTYPE, mode="r")
+            # 多个行情源共用录制时，记录可能没有严格按时间排序
+            if (np.diff(data["ts"]) < 0).any():
+                data = np.sort(data, order="ts")
+            self.data[name[:-4]] = data
+
+        if start:
+            self.start_ts = datetime.strptime(date + start, "%Y%m%d%H%M%S").timestamp()
+        elif self.data:
+            self.start_ts = min(float(data["ts"][0]) for data in self.data.values())
+        else:
+            self.start_ts = datetime.strptime(date, "%Y%m%d").timestamp()
+        self._wall = None
+
+    def connect_api(self):
+        """开始回放"""
+        if not self.connected:
+            self._wall = time.time()
+            self.connected = True
+        return True
+
+    def timestamp(self):
+        """当前回放时间戳"""
+        if self._wall is None:
+            return self.start_ts
+        return self.start_ts + (time.time() - self._wall) * self.speed
+
+    def now(self):
+        """当前回放时间"""
+        return datetime.fromtimestamp(self.timestamp())
+
+    def get_realtime_data(self, symbol: str):
+        """获取股票回放时间的行情"""
+        df = self.get_realtime_data_batch([symbol])
+        return df.drop(columns="pt_symbol") if len(df) else df
+
+    def get_realtime_data_batch(self, symbols: list):
+        """
+        批量获取股票回放时间的行情
+        :return: 每个证券一行的dataframe，pt_symbol列为证券代码
+        """
+        ts = self.timestamp()
+        rows = list()
+        found = list()
+        for symbol in symbols:
+            data = self.data.get(symbol)
+            if data is None:
+                continue
+            i = np.searchsorted(data["ts"], ts, side="right") - 1
+            if i < 0:
+                continue
+            rows.append(data[i])
+            found.append(symbol)
+
+        if not rows:
+            return pd.DataFrame()
+
+        df = pd.DataFrame(np.array(rows, dtype=QUOTE_DTYPE)[QUOTE_FIELDS])
+        codes = [symbol.split(".") for symbol in found]
+        df.insert(0, "market", [exchange_map[exchange] for code, exchange in codes])
+        df.insert(1, "code", [code for code, exchange in codes])
+        df["pt_symbol"] = found
+        return df
+
+    def get_close_prices(self, symbols):
+        """批量获取收盘价格"""
+        return close_price_dict(self.get_realtime_data_batch(list(symbols)))
+
+    def close(self):
+        """数据服务关闭"""
+        self.connected = False
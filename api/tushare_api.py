@@ -5,6 +5,9 @@ import tushare as ts
 
 from paper_trading.utility.setting import SETTINGS
 
+# 单次行情请求的最大证券数量
+QUOTES_BATCH = 80
+
 
 class TushareService():
     """Tushare数据服务类"""
@@ -35,20 +38,52 @@ class TushareService():
         except ConnectionError:
             raise Exception("股票数据获取失败")
 
+    def get_close_prices(self, symbols):
+        """
+        批量获取收盘价格
+        :return: {证券代码: 最新价格}
+        """
+        symbol_map = {symbol.split('.')[0]: symbol for symbol in symbols}
+        codes = list(symbol_map.keys())
+        price_dict = dict()
+        try:
+            for i in range(0, len(codes), QUOTES_BATCH):
+                df = ts.get_realtime_quotes(codes[i:i + QUOTES_BATCH])
+                if df is None:
+                    continue
+                for code, price in zip(df['code'], df['price'].astype(float)):
+                    if code in symbol_map:
+                        price_dict[symbol_map[code]] = round(price, 5)
+        except ConnectionError:
+            raise Exception("股票数据获取失败")
+
+        return price_dict
+
     @property
     def is_trade_date(self):
         """获取交易日期"""
-        d = datetime.now().strftime("%Y%m%D")
+        d = datetime.now().strftime("%Y%m%d")
         try:
             df = self.pro_api.trade_cal(
                 exchange='SSE', start_date=d, end_date=d)
-            if len(df):
+            if len(df) and int(df['is_open'].iloc[0]) == 1:
                 return True
             else:
                 return False
         except ConnectionError:
             raise Exception("交易日信息获取失败")
 
+    def get_trade_cal(self, start: str, end: str):
+        """
+        获取交易日历
+        :return: dataframe数据，包含cal_date、is_open列
+        """
+        try:
+            return self.pro_api.trade_cal(
+                exchange='SSE', start_date=start, end_date=end, fields='cal_date,is_open')
+        except ConnectionError:
+            raise Exception("交易日信息获取失败")
+
     def close(self):
         """数据服务关闭"""
         self.connected = False
@@ -0,0 +1,191 @@
+
+import sys
+import asyncio
+from io import BytesIO
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+from paper_trading.trade.push_engine import sse_message
+
+
+class AsgiApp:
+    """
+    ASGI适配器
+    将flask应用包装为ASGI应用，路由与main_blue完全一致，
+    请求在事件循环中异步接收和发送，视图函数在线程池中执行，
+    流式响应（如/orders_export）逐块在线程池中生成，客户端断开时关闭生成器；
+    /stream在事件循环中直接推送，订阅者等待消息时不占用线程池
+    """
+
+    def __init__(self, wsgi_app, engine=None, workers: int = 64):
+        self.wsgi_app = wsgi_app                                    # flask应用
+        self.engine = engine                                        # 模拟交易主引擎
+        self.executor = ThreadPoolExecutor(max_workers=workers)     # 视图执行线程池
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.handle(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        """服务启动及关闭"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def handle(self, scope, receive, send):
+        """处理http请求"""
+        loop = asyncio.get_running_loop()
+
+        # 读取请求体
+        body = BytesIO()
+        more_body = True
+        while more_body:
+            message = await receive()
+            body.write(message.get('body', b''))
+            more_body = message.get('more_body', False)
+        body.seek(0)
+
+        # 订阅推送
+        if scope['method'] == 'GET' and scope['path'] == '/stream':
+            token = parse_qs(scope['query_string'].decode('latin-1')).get('token', [''])[0]
+            if token and self.engine and self.engine.push_engine:
+                await self.stream(token, receive, send)
+                return
+
+        environ = self.build_environ(scope, body)
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers
+            ]
+
+        result = await loop.run_in_executor(self.executor, self.wsgi_app, environ, start_response)
+
+        # 监听客户端断开
+        disconnected = asyncio.Event()
+        watcher = loop.create_task(self.watch_disconnect(receive, disconnected))
+        iterator = iter(result)
+        try:
+            started = False
+            while not disconnected.is_set():
+                chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+                if chunk is None:
+                    break
+                if not started:
+                    await send({
+                        'type': 'http.response.start',
+                        'status': response['status'],
+                        'headers': response['headers']
+                    })
+                    started = True
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+            if not disconnected.is_set():
+                if not started:
+                    await send({
+                        'type': 'http.response.start',
+                        'status': response['status'],
+                        'headers': response['headers']
+                    })
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            watcher.cancel()
+            # 关闭响应，流式响应的生成器在此时释放订阅等资源
+            if hasattr(result, 'close'):
+                await loop.run_in_executor(self.executor, result.close)
+
+    @staticmethod
+    async def watch_disconnect(receive, disconnected: asyncio.Event):
+        """等待客户端断开"""
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+                return
+
+    async def stream(self, token: str, receive, send):
+        """
+        以SSE方式推送账户消息
+        推送引擎通过loop.call_soon_threadsafe将消息放入订阅者的asyncio.Queue，
+        超过心跳间隔没有消息时发送心跳
+        """
+        loop = asyncio.get_running_loop()
+        push_engine = self.engine.push_engine
+        heartbeat = self.engine._settings['PUSH_HEARTBEAT']
+
+        sub = push_engine.subscribe(token, loop)
+        disconnected = asyncio.Event()
+        watcher = loop.create_task(self.watch_disconnect(receive, disconnected))
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream; charset=utf-8'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no'),
+                ]
+            })
+            while True:
+                getter = loop.create_task(sub.get(heartbeat))
+                await asyncio.wait([getter, watcher], return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.is_set():
+                    getter.cancel()
+                    break
+                await send({'type': 'http.response.body', 'body': sse_message(getter.result()), 'more_body': True})
+        finally:
+            watcher.cancel()
+            push_engine.unsubscribe(sub)
+
+    @staticmethod
+    def build_environ(scope, body):
+        """由ASGI scope生成WSGI environ"""
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': 'HTTP/%s' % scope['http_version'],
+            'REMOTE_ADDR': client[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+
+        for name, value in scope['headers']:
+            name = name.decode('latin-1')
+            value = value.decode('latin-1')
+            if name == 'content-type':
+                key = 'CONTENT_TYPE'
+            elif name == 'content-length':
+                key = 'CONTENT_LENGTH'
+            else:
+                key = 'HTTP_' + name.upper().replace('-', '_')
+            if key in environ:
+                value = environ[key] + ',' + value
+            environ[key] = value
+
+        return environ
+
+
+def creat_asgi_app(app, engine=None, workers: int = 64):
+    """创建ASGI应用"""
+    return AsgiApp(app.wsgi_app, engine, workers)
@@ -1,8 +1,15 @@
 
 import json
-from flask import Blueprint, request, jsonify, render_template
+import math
+from threading import Lock
+from collections import OrderedDict
+from flask import Blueprint, request, render_template, Response, stream_with_context
 
 from paper_trading.api.db import MongoDBService
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.utility.serializer import dumps
+from paper_trading.trade.report_builder import batch_report
+from paper_trading.trade.push_engine import sse_message
 from paper_trading.trade.data_center import (
     get_stock_daily_qfq,
     get_stock_mtime
@@ -16,8 +23,7 @@ from paper_trading.trade.db_model import (
     on_account_delete,
     query_account_list,
     query_orders_by_symbol,
-    query_order_status,
-    query_order_one, query_orders)
+    query_order_one)
 
 # 主引擎
 main_engine = None
@@ -32,6 +38,13 @@ test_db = None
 # 行情实例
 tdx = None
 
+# 账户查询响应缓存 {(接口, token): (账户数据版本, 响应字节串)}，按最近使用顺序排列
+response_cache = OrderedDict()
+response_cache_lock = Lock()
+
+# 使用响应缓存的接口
+CACHED_VIEWS = ("account", "pos")
+
 blue = Blueprint('main_blue', __name__)
 
 def init_blue(app, engine):
@@ -55,6 +68,47 @@ def init_blue(app, engine):
     test_db.connect_db()
 
 
+def json_response(rps):
+    """序列化响应数据"""
+    return Response(dumps(rps), mimetype="application/json")
+
+
+def cached_response(name: str, token: str, build):
+    """
+    账户查询响应，账户数据版本不变时直接返回已序列化的字节串
+    :param name: 接口名称
+    :param build: 生成响应数据的函数
+    """
+    version = account_engine.query_version(token)
+    if version is None:
+        # 账户已登出，清除该账户的缓存
+        evict_response_cache(token)
+        return json_response(build())
+
+    key = (name, token)
+    with response_cache_lock:
+        cached = response_cache.get(key)
+        if cached and cached[0] == version:
+            response_cache.move_to_end(key)
+            return Response(cached[1], mimetype="application/json")
+
+    body = dumps(build())
+    with response_cache_lock:
+        response_cache[key] = (version, body)
+        response_cache.move_to_end(key)
+        while len(response_cache) > SETTINGS['RESPONSE_CACHE_SIZE']:
+            response_cache.popitem(last=False)
+
+    return Response(body, mimetype="application/json")
+
+
+def evict_response_cache(token: str):
+    """清除账户的响应缓存"""
+    with response_cache_lock:
+        for name in CACHED_VIEWS:
+            response_cache.pop((name, token), None)
+
+
 """web page"""
 
 
@@ -109,7 +163,7 @@ def account_login():
         rps['status'] = False
         rps['data'] = "请求参数错误"
 
-    return jsonify(rps)
+    return json_response(rps)
 
 
 @blue.route('/creat', methods=["POST"])
@@ -131,7 +185,7 @@ def account_creat():
         rps['status'] = False
         rps['data'] = "请求参数错误"
 
-    return jsonify(rps)
+    return json_response(rps)
 
 
 @blue.route('/delete', methods=["POST"])
@@ -144,6 +198,7 @@ def account_delete():
         token = request.form["token"]
         if on_account_exist(token, db):
             account_engine.logout(token)
+            evict_response_cache(token)
             result = on_account_delete(token, db)
             if result:
                 rps['data'] = "账户删除成功"
@@ -157,7 +212,7 @@ def account_delete():
         rps['status'] = False
         rps['data'] = "请求参数错误"
 
-    return jsonify(rps)
+    return json_response(rps)
 
 
 @blue.route('/list', methods=["GET"])
@@ -174,7 +229,7 @@ def account_list():
         rps['status'] = False
         rps['data'] = "账户列表为空"
 
-    return jsonify(rps)
+    return json_response(rps)
 
 
 @blue.route('/account', methods=["POST"])
@@ -185,14 +240,17 @@ def account_query():
 
     if request.form.get("token"):
         token = request.form["token"]
-        status, account = account_engine.query_account_data(token)
-        rps['status'] = status
-        rps['data'] = account
+
+        def build():
+            status, account = account_engine.query_account_data(token)
+            return {'status': status, 'data': account}
+
+        return cached_response("account", token, build)
     else:
         rps['status'] = False
         rps['data'] = "请求参数错误"
 
-    return jsonify(rps)
+    return json_response(rps)
 
 
 @blue.route('/pos', methods=["POST"])
@@ -203,14 +261,17 @@ def position_query():
 
     if request.form.get("token"):
         token = request.form["token"]
-        status, pos = account_engine.query_pos_data(token)
-        rps['status'] = status
-        rps['data'] = pos
+
+        def build():
+            status, pos = account_engine.query_pos_data(token)
+            return {'status': status, 'data': pos}
+
+        return cached_response("pos", token, build)
     else:
         rps['status'] = False
         rps['data'] = "请求参数错误"
 
-    return jsonify(rps)
+    return json_response(rps)
 
 
 @blue.route('/orders', methods=["POST"])
@@ -223,12 +284,18 @@ def orders_query():
         token = request.form["token"]
         start_date = request.form.get("start_date")
         end_date = request.form.get("end_date")
-        if start_date and end_date:
-            flt = {"order_date": {"$gte": start_date, "$lte": end_date}}
-        else:
-            flt = {}
+        limit = request.form.get("limit", type=int)
+        cursor = request.form.get("cursor")
+        fields = parse_fields(request.form.get("fields"))
         try:
-            data = query_orders(token, db, flt)
+            if limit or cursor or fields:
+                # 分页查询
+                status, orders, next_cursor = account_engine.query_orders_page(
+                    token, start_date, end_date, cursor, limit, fields
+                )
+                data = {"orders": orders, "next_cursor": next_cursor}
+            else:
+                status, data = account_engine.query_orders_by_date(token, start_date, end_date)
         except Exception as e:
             status = False
             data = "查询订单失败"
@@ -240,7 +307,32 @@ def orders_query():
         rps['status'] = False
         rps['data'] = "请求参数错误"
 
-    return jsonify(rps)
+    return json_response(rps)
+
+
+def parse_fields(fields: str):
+    """解析逗号分隔的字段列表"""
+    if not fields:
+        return None
+    return [f.strip() for f in fields.split(",") if f.strip()]
+
+
+@blue.route('/orders_export', methods=["POST"])
+def orders_export():
+    """以NDJSON格式流式导出订单，每行一个订单"""
+    if not request.form.get("token"):
+        return json_response({"status": False, "data": "请求参数错误"})
+
+    token = request.form["token"]
+    start_date = request.form.get("start_date")
+    end_date = request.form.get("end_date")
+    fields = parse_fields(request.form.get("fields"))
+
+    def generate():
+        for order in account_engine.export_orders(token, start_date, end_date, fields=fields):
+            yield dumps(order) + b"\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
 
 @blue.route('/orders_today', methods=["POST"])
@@ -258,7 +350,7 @@ def orders_today_query():
         rps['status'] = False
         rps['data'] = "请求参数错误"
 
-    return jsonify(rps)
+    return json_response(rps)
 
 
 @blue.route('/send', methods=["POST"])
@@ -287,7 +379,53 @@ def order_arrived():
         rps['status'] = False
         rps['data'] = "请求参数错误"
 
-    return jsonify(rps)
+    return json_response(rps)
+
+
+@blue.route('/send_batch', methods=["POST"])
+def order_arrived_batch():
+    """批量接收订单"""
+    rps = {}
+    rps['status'] = True
+
+    if request.form.get("orders"):
+        data = json.loads(request.form["orders"])
+        if isinstance(data, list):
+            results = [None] * len(data)
+
+            # 按账户分组，同一账户的订单一次性验证并冻结资金
+            groups = dict()
+            for i, d in enumerate(data):
+                try:
+                    order = new_order_generate(d)
+                except ValueError as e:
+                    results[i] = {"error": str(e)}
+                else:
+                    groups.setdefault(order.account_id, []).append((i, order))
+
+            for token, items in groups.items():
+                orders = [order for i, order in items]
+                accepted = list()
+                for (i, order), (result, msg) in zip(items, main_engine.on_orders_arrived_batch(token, orders)):
+                    if result:
+                        accepted.append(msg)
+                        results[i] = {"order_id": msg.order_id}
+                    else:
+                        results[i] = {"error": msg}
+
+                # 将订单一次性送入交易引擎
+                if accepted:
+                    main_engine.order_put_batch(accepted)
+
+            rps['data'] = results
+        else:
+            rps['status'] = False
+            rps['data'] = "订单数据错误"
+    else:
+        rps['status'] = False
+        rps['data'] = "请求参数错误"
+
+    return json_response(rps)
 
 
 @blue.route('/cancel', methods=["POST"])
@@ -319,7 +457,71 @@ def order_cancel():
         rps['status'] = False
         rps['data'] = "请求参数错误"
 
-    return jsonify(rps)
+    return json_response(rps)
+
+
+def cancel_open_orders(token, orders):
+    """撤销内存中查询到的未完成订单"""
+    cancel_orders = [
+        cancel_order_generate(token, o['order_id'], code=o['code'], exchange=o['exchange'])
+        for o in orders
+    ]
+    results = main_engine.order_cancel_batch(cancel_orders)
+
+    return {
+        order.order_id: "撤单成功" if result else "撤单失败"
+        for order, result in zip(cancel_orders, results)
+    }
+
+
+@blue.route('/cancel_batch', methods=["POST"])
+def order_cancel_batch():
+    """批量取消订单"""
+    rps = {}
+    rps['status'] = True
+
+    if request.form.get("token") and request.form.get("order_ids"):
+        token = request.form["token"]
+        order_ids = json.loads(request.form["order_ids"])
+        if isinstance(order_ids, list):
+            status, orders = account_engine.query_open_orders(token, order_ids=order_ids)
+            if status:
+                data = {order_id: "无此未完成订单" for order_id in order_ids}
+                data.update(cancel_open_orders(token, orders))
+                rps['data'] = data
+            else:
+                rps['status'] = False
+                rps['data'] = orders
+        else:
+            rps['status'] = False
+            rps['data'] = "请求参数错误"
+    else:
+        rps['status'] = False
+        rps['data'] = "请求参数错误"
+
+    return json_response(rps)
+
+
+@blue.route('/cancel_all', methods=["POST"])
+def order_cancel_all():
+    """取消账户所有未完成的订单，可以指定证券代码"""
+    rps = {}
+    rps['status'] = True
+
+    if request.form.get("token"):
+        token = request.form["token"]
+        symbol = request.form.get("symbol")
+        status, orders = account_engine.query_open_orders(token, symbol=symbol)
+        if status:
+            rps['data'] = cancel_open_orders(token, orders)
+        else:
+            rps['status'] = False
+            rps['data'] = orders
+    else:
+        rps['status'] = False
+        rps['data'] = "请求参数错误"
+
+    return json_response(rps)
 
 
 @blue.route('/status', methods=["POST"])
@@ -332,8 +534,7 @@ def get_status():
         if request.form.get("order_id"):
             token = request.form["token"]
             order_id = request.form["order_id"]
-            result, order_status = query_order_status(
-                token, order_id, db)
+            result, order_status = account_engine.query_order_status(token, order_id)
             if result:
                 rps['data'] = order_status
             else:
@@ -346,7 +547,33 @@ def get_status():
         rps['status'] = False
         rps['data'] = "请求参数错误"
 
-    return jsonify(rps)
+    return json_response(rps)
+
+
+@blue.route('/stream', methods=["GET"])
+def order_stream():
+    """以SSE方式推送账户的订单状态、成交及账户资金变化"""
+    token = request.args.get("token")
+    if not token:
+        return json_response({"status": False, "data": "请求参数错误"})
+
+    push_engine = main_engine.push_engine
+    if not push_engine:
+        return json_response({"status": False, "data": "推送服务未开启"})
+
+    sub = push_engine.subscribe(token)
+
+    def generate():
+        try:
+            while True:
+                # 超时返回None时发送心跳，保持连接并及时发现客户端断开
+                msg = sub.get(main_engine._settings['PUSH_HEARTBEAT'])
+                yield sse_message(msg)
+        finally:
+            push_engine.unsubscribe(sub)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(generate(), mimetype="text/event-stream", headers=headers)
 
 
 @blue.route('/liquidation', methods=["POST"])
@@ -361,7 +588,10 @@ def liquidation():
         price_dict = {}
         if request.form.get("price_dict"):
             price_dict = request.form["price_dict"]
-            price_dict = json.loads(price_dict)
+            try:
+                price_dict = parse_price_dict(json.loads(price_dict))
+            except ValueError:
+                price_dict = None
             if isinstance(price_dict, dict):
                 if account_engine.liq_manual(token, liq_date, price_dict):
                     rps['data'] = "清算完成"
@@ -378,7 +608,76 @@ def liquidation():
         rps['status'] = False
         rps['data'] = "请求参数错误"
 
-    return jsonify(rps)
+    return json_response(rps)
+
+
+def parse_price(price):
+    """检查收盘价格，必须为有限的数值，null表示没有价格"""
+    if price is None:
+        return None
+    if isinstance(price, bool) or not isinstance(price, (int, float)) or not math.isfinite(price):
+        raise ValueError("收盘价格必须为数值")
+    return float(price)
+
+
+def parse_price_dict(price_dict: dict):
+    """
+    解析收盘价格字典
+    :return: {证券代码: 收盘价格}，去除没有价格的证券
+    """
+    if not isinstance(price_dict, dict):
+        raise ValueError("收盘价格格式错误")
+
+    prices = {symbol: parse_price(price) for symbol, price in price_dict.items()}
+    return {symbol: price for symbol, price in prices.items() if price is not None}
+
+
+def parse_price_matrix(matrix: dict):
+    """
+    解析收盘价格矩阵
+    :param matrix: {"dates": [日期], "symbols": [证券代码], "prices": [[价格]]}，
+                   prices每行对应一个日期，每列对应一个证券，没有价格时为null
+    :return: [(清算日期, 收盘价格字典)]
+    """
+    dates = matrix["dates"]
+    symbols = matrix["symbols"]
+    prices = matrix["prices"]
+    if len(prices) != len(dates) or any(len(row) != len(symbols) for row in prices):
+        raise ValueError("价格矩阵与日期或证券数量不一致")
+
+    return [
+        (liq_date, parse_price_dict(dict(zip(symbols, row))))
+        for liq_date, row in zip(dates, prices)
+    ]
+
+
+@blue.route('/liquidation_batch', methods=["POST"])
+def liquidation_batch():
+    """批量清算，使用同一份收盘价格清算多个账户，支持按日期范围依次清算"""
+    rps = {}
+    rps['status'] = True
+
+    try:
+        tokens = None
+        if request.form.get("tokens"):
+            tokens = json.loads(request.form["tokens"])
+            if not isinstance(tokens, list):
+                raise ValueError
+
+        if request.form.get("price_matrix"):
+            liq_list = parse_price_matrix(json.loads(request.form["price_matrix"]))
+        else:
+            price_dict = parse_price_dict(json.loads(request.form["price_dict"]))
+            liq_list = [(request.form["check_date"], price_dict)]
+    except (ValueError, KeyError, TypeError):
+        rps['status'] = False
+        rps['data'] = "请求参数错误"
+        return json_response(rps)
+
+    success, failed = account_engine.liq_batch(liq_list, tokens)
+    rps['data'] = {"success": success, "failed": failed}
+
+    return json_response(rps)
 
 
 @blue.route('/account_record', methods=['POST'])
@@ -398,7 +697,49 @@ def get_account_record():
         rps['status'] = False
         rps['data'] = "请求参数错误"
 
-    return jsonify(rps)
+    return json_response(rps)
+
+
+@blue.route('/report', methods=['POST'])
+def get_report():
+    """获取交易结果报表"""
+    rps = {}
+    rps['status'] = True
+
+    if request.form.get("token"):
+        token = request.form["token"]
+        start = request.form.get("start")
+        end = request.form.get("end")
+        status, report = account_engine.query_report(token, start, end)
+        rps['status'] = status
+        rps['data'] = report
+    else:
+        rps['status'] = False
+        rps['data'] = "请求参数错误"
+
+    return json_response(rps)
+
+
+@blue.route('/report_batch', methods=['POST'])
+def get_report_batch():
+    """批量获取多个账户的交易结果报表"""
+    rps = {}
+    rps['status'] = True
+
+    if request.form.get("tokens"):
+        tokens = json.loads(request.form["tokens"])
+        start = request.form.get("start")
+        end = request.form.get("end")
+        if isinstance(tokens, list):
+            rps['data'] = batch_report(tokens, start, end)
+        else:
+            rps['status'] = False
+            rps['data'] = "请求参数错误"
+    else:
+        rps['status'] = False
+        rps['data'] = "请求参数错误"
+
+    return json_response(rps)
 
 
 @blue.route('/pos_record', methods=['POST'])
@@ -418,7 +759,7 @@ def get_pos_record():
         rps['status'] = False
         rps['data'] = "请求参数错误"
 
-    return jsonify(rps)
+    return json_response(rps)
 
 
 @blue.route('/persistance', methods=['POST'])
@@ -440,7 +781,7 @@ def persistance():
         rps['status'] = False
         rps['data'] = "请求参数错误"
 
-    return jsonify(rps)
+    return json_response(rps)
 
 
 @blue.route('/test', methods=['POST'])
@@ -458,7 +799,7 @@ def test():
         rps['status'] = False
         rps['data'] = "请求参数错误"
 
-    return jsonify(rps)
+    return json_response(rps)
 
 """data for web page"""
 
@@ -469,13 +810,12 @@ def orders_for_page():
     rps = []
     if request.form.get("token"):
         token = request.form["token"]
-        orders = account_engine.query_orders(token)
+        status, orders = account_engine.query_orders_by_date(token)
         if orders:
-            if isinstance(orders, list):
-                rps = orders
+            rps = orders
 
     new_data = {'aaData': rps}
-    return jsonify(new_data)
+    return json_response(new_data)
 
 
 @blue.route('/orders_today_page', methods=["POST"])
@@ -485,12 +825,11 @@ def orders_today_for_page():
     if request.form.get("token"):
         token = request.form["token"]
         status, orders = account_engine.query_orders_today(token)
-        if orders:
-            if isinstance(orders, list):
-                rps = orders
+        if status and isinstance(orders, list):
+            rps = orders
 
     new_data = {'aaData':rps}
-    return jsonify(new_data)
+    return json_response(new_data)
 
 
 @blue.route('/orders_page_by_symbol', methods=["POST"])
@@ -506,7 +845,7 @@ def orders_for_page_by_symbol():
                 rps = orders
 
     new_data = {'aaData':rps}
-    return jsonify(new_data)
+    return json_response(new_data)
 
 
 @blue.route('/pos_record_page', methods=['POST'])
@@ -521,7 +860,7 @@ def get_pos_record_for_page():
                 rps = pos_record
 
     new_data = {'aaData': rps}
-    return jsonify(new_data)
+    return json_response(new_data)
 
 
 """stock data"""
@@ -546,7 +885,7 @@ def get_test_hq_for_page():
         rps['status'] = False
         rps['data'] = "请求参数错误"
 
-    return jsonify(rps)
+    return json_response(rps)
 
 
 @blue.route('/kline_page', methods=['POST'])
@@ -561,7 +900,7 @@ def get_kline_for_page():
                 rps = pos
 
     new_data = {'aaData': rps}
-    return jsonify(new_data)
+    return json_response(new_data)
 
 
 @blue.route('/mtime_page', methods=['POST'])
@@ -583,4 +922,4 @@ def get_mtime_for_page():
         rps['status'] = False
         rps['data'] = "请求参数错误"
 
-    return jsonify(rps)
+    return json_response(rps)
@@ -10,6 +10,8 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 class Config:
     DEBUG = False
     SECRET_KEY = os.environ.get("SECRET_KEY") or "j1as78a1gf6a4ea1f5d6a78e41fa56e"
+    # ASGI模式下执行视图函数的线程数量，/stream订阅在事件循环中推送，不占用线程
+    ASGI_WORKERS = 64
 
     @staticmethod
     def init_app(app):
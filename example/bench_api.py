@@ -0,0 +1,94 @@
+
+"""
+模拟交易接口压力测试
+使用多个线程并发请求接口，统计p50、p99延迟及每秒请求数，
+可以分别对flask服务（python run.py）和ASGI服务（python run.py asgi）进行测试并对比结果
+
+python bench_api.py --url http://127.0.0.1:5000 --token nYf82sYLNoMT7T8mdvf4 --path account --threads 200 --num 20000
+"""
+
+import time
+import argparse
+from threading import Thread, Lock
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def bench(url: str, data: dict, threads: int, num: int):
+    """
+    并发请求测试
+    :param url:请求地址
+    :param data:请求参数
+    :param threads:并发线程数量
+    :param num:总请求数量
+    :return:dict格式测试结果
+    """
+    latency = list()
+    errors = [0]
+    lock = Lock()
+    per_thread = num // threads
+
+    def worker():
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        result = list()
+        error = 0
+        for i in range(per_thread):
+            start = time.perf_counter()
+            try:
+                r = session.post(url, data, timeout=30)
+                if r.status_code != requests.codes.ok:
+                    error += 1
+            except requests.RequestException:
+                error += 1
+            result.append(time.perf_counter() - start)
+
+        with lock:
+            latency.extend(result)
+            errors[0] += error
+
+    workers = [Thread(target=worker) for i in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    latency = np.array(latency) * 1000
+    return {
+        "请求数": len(latency),
+        "错误数": errors[0],
+        "耗时(s)": round(elapsed, 2),
+        "每秒请求数": round(len(latency) / elapsed, 1),
+        "p50(ms)": round(float(np.percentile(latency, 50)), 2),
+        "p99(ms)": round(float(np.percentile(latency, 99)), 2),
+        "最大(ms)": round(float(latency.max()), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟交易接口压力测试")
+    parser.add_argument("--url", nargs="+", required=True, help="服务地址，可以传入多个进行对比")
+    parser.add_argument("--token", required=True, help="账户token")
+    parser.add_argument("--path", default="account", help="测试的接口，默认account")
+    parser.add_argument("--threads", type=int, default=200, help="并发线程数量")
+    parser.add_argument("--num", type=int, default=20000, help="总请求数量")
+    args = parser.parse_args()
+
+    data = {"token": args.token}
+    for home in args.url:
+        url = "/".join([home.rstrip("/"), args.path])
+        # 预热
+        requests.post(url, data, timeout=30)
+
+        result = bench(url, data, args.threads, args.num)
+        print(url)
+        for k, v in result.items():
+            print(f"    {k}: {v}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+
+"""
+交易撮合性能测试
+使用回放行情源离线运行ChinaAMarket，按倍速回放录制的行情（或生成的模拟行情），统计成交数量及成交速度，
+不需要连接行情服务器及数据库
+
+python bench_market.py --symbols 100 --orders 10000 --speed 60 --seconds 30
+python bench_market.py --root ../quotes --date 20200107 --speed 100
+python bench_market.py --depth --volume 50000
+"""
+
+import os
+import time
+import argparse
+import tempfile
+from datetime import datetime
+from threading import Thread
+
+import numpy as np
+
+from paper_trading.api.quote_replay import QUOTE_DTYPE, quote_path, ReplayQuoteService
+from paper_trading.trade.market import ChinaAMarket
+from paper_trading.utility.model import Order
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.utility.constant import OrderType, PriceType
+
+
+class NullEventEngine:
+    """不处理事件的事件引擎"""
+
+    def put(self, event):
+        pass
+
+    def register(self, type, handler):
+        pass
+
+
+class CountingAccountEngine:
+    """只统计成交的账户引擎"""
+
+    def __init__(self):
+        self.deals = 0
+        self.deal_volume = 0
+        self.filled = 0
+
+    def load_data(self):
+        return {}
+
+    def orders_deal(self, order, volume=None, price=None):
+        self.deals += 1
+        self.deal_volume += order.traded if volume is None else volume
+        if order.traded >= order.volume:
+            self.filled += 1
+
+    def orders_cancel(self, order):
+        pass
+
+    def orders_refused(self, order):
+        pass
+
+    def orders_status_update(self, order):
+        pass
+
+    def liquidation(self, hq_client, liq_date=None):
+        return 0, 0
+
+
+def make_quotes(root: str, date: str, num: int, interval: int = 3, seed: int = 0):
+    """
+    生成一个交易日的模拟行情文件
+    :return: 证券代码列表
+    """
+    rng = np.random.RandomState(seed)
+    day = datetime.strptime(date, "%Y%m%d")
+    ts = np.concatenate([
+        np.arange(day.replace(hour=9, minute=15).timestamp(), day.replace(hour=11, minute=30).timestamp(), interval),
+        np.arange(day.replace(hour=13).timestamp(), day.replace(hour=15).timestamp(), interval),
+    ])
+
+    os.makedirs(quote_path(root, date), exist_ok=True)
+    symbols = list()
+    for n in range(num):
+        symbol = f"{600000 + n}.SH"
+        price = np.maximum(10 * np.exp(np.cumsum(rng.normal(0, 0.001, len(ts)))), 0.01).round(2)
+
+        data = np.zeros(len(ts), dtype=QUOTE_DTYPE)
+        data["ts"] = ts
+        data["price"] = price
+        data["last_close"] = price[0]
+        for i in range(1, 6):
+            data[f"ask{i}"] = price + 0.01 * i
+            data[f"bid{i}"] = price - 0.01 * (i - 1)
+            data[f"ask_vol{i}"] = rng.randint(1, 500, len(ts))
+            data[f"bid_vol{i}"] = rng.randint(1, 500, len(ts))
+        data.tofile(quote_path(root, date, symbol))
+        symbols.append(symbol)
+
+    return symbols
+
+
+def make_orders(symbols: list, num: int, volume: int, replay: ReplayQuoteService, seed: int = 0):
+    """按回放开始时的行情生成限价订单，委托价格在最新价上下波动，订单在回放过程中陆续成交"""
+    rng = np.random.RandomState(seed)
+    df = replay.get_realtime_data_batch(symbols).set_index("pt_symbol")
+
+    orders = list()
+    for n in range(num):
+        symbol = symbols[rng.randint(len(symbols))]
+        code, exchange = symbol.split(".")
+        order_type = rng.choice([OrderType.BUY.value, OrderType.SELL.value])
+        offset = rng.uniform(-0.02, 0.01) if order_type == OrderType.BUY.value else rng.uniform(-0.01, 0.02)
+        orders.append(Order(
+            code=code,
+            exchange=exchange,
+            account_id="bench",
+            order_id=str(n),
+            order_type=order_type,
+            price_type=PriceType.LIMIT.value,
+            order_price=round(float(df.loc[symbol, "price"]) * (1 + offset), 2),
+            volume=volume,
+        ))
+
+    return orders
+
+
+def main():
+    parser = argparse.ArgumentParser(description="交易撮合性能测试")
+    parser.add_argument("--root", default="", help="行情文件目录，默认生成模拟行情")
+    parser.add_argument("--date", default="", help="回放的交易日，格式为YYYYMMDD")
+    parser.add_argument("--start", default="093000", help="回放开始时间，格式为HHMMSS")
+    parser.add_argument("--symbols", type=int, default=100, help="生成模拟行情的证券数量")
+    parser.add_argument("--orders", type=int, default=10000, help="订单数量")
+    parser.add_argument("--speed", type=float, default=60, help="回放倍速")
+    parser.add_argument("--seconds", type=float, default=30, help="测试时长（秒）")
+    parser.add_argument("--volume", type=int, default=100, help="每个订单的委托数量")
+    parser.add_argument("--depth", action="store_true", help="按盘口深度撮合，盘口数量不足时部分成交")
+    args = parser.parse_args()
+
+    SETTINGS['VOLUME_SIMULATION'] = args.depth
+
+    root = args.root or tempfile.mkdtemp(prefix="quotes_")
+    date = args.date or "20200107"
+    if args.root:
+        symbols = [name[:-4] for name in os.listdir(quote_path(root, date)) if name.endswith(".bin")]
+    else:
+        symbols = make_quotes(root, date, args.symbols)
+
+    replay = ReplayQuoteService(root, date, args.speed, args.start)
+    account_engine = CountingAccountEngine()
+    market = ChinaAMarket(NullEventEngine(), account_engine, replay, {})
+    market.on_init()
+
+    orders = make_orders(symbols, args.orders, args.volume, replay)
+    market.on_orders_arrived_batch(orders)
+    print(f"证券数量：{len(symbols)}，订单数量：{len(orders)}，回放倍速：{args.speed}")
+
+    thread = Thread(target=market.on_match, daemon=True)
+    start = time.perf_counter()
+    replay_start = replay.timestamp()
+    thread.start()
+
+    while thread.is_alive() and time.perf_counter() - start < args.seconds and market.orders_book:
+        time.sleep(0.1)
+
+    elapsed = time.perf_counter() - start
+    replayed = replay.timestamp() - replay_start
+    market.stop()
+    thread.join()
+
+    print(f"耗时：{elapsed:.2f}s，回放行情时间：{replayed:.0f}s（{replayed / elapsed:.1f}倍实时）")
+    print(f"成交笔数：{account_engine.deals}，全部成交订单：{account_engine.filled}，"
+          f"成交数量：{account_engine.deal_volume:.0f}，剩余挂单：{len(market.orders_book)}，"
+          f"每秒成交：{account_engine.deals / elapsed:.0f}")
+
+
+if __name__ == "__main__":
+    main()
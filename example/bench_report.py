@@ -0,0 +1,128 @@
+
+"""
+报表统计性能测试
+对比逐行计算与向量化计算的耗时，并检查两者结果一致
+
+python bench_report.py --num 1000000
+"""
+
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from paper_trading.utility.statistics import commission_cal, max_drawdown_cal
+
+
+COST = 0.0003
+TAX = 0.001
+
+
+def commission_legacy(trade_df):
+    """逐行计算手续费"""
+    trade_df = trade_df.copy()
+    trade_df['commission'] = 0.
+    for i, row in trade_df.iterrows():
+        commission = 0.
+        if row['order_type'] == "buy":
+            commission = row['traded'] * row['trade_price'] * COST
+        elif row['order_type'] == "sell":
+            commission = row['traded'] * row['trade_price'] * (COST + TAX)
+        trade_df.loc[i, 'commission'] = commission
+
+    return trade_df['commission'].values
+
+
+def max_drawdown_legacy(assets_df):
+    """逐行计算最大回撤"""
+    drawdown_list = list()
+    assets_list = list()
+    base_data = 0
+    for i, row in assets_df.iterrows():
+        if base_data <= row['assets']:
+            if assets_list:
+                assets_list.append(base_data)
+                assets_list.sort()
+                drawdown_list.append(assets_list[-1] - assets_list[0])
+                assets_list.clear()
+            base_data = row['assets']
+        else:
+            assets_list.append(row['assets'])
+
+    if drawdown_list:
+        drawdown_list.sort()
+        return drawdown_list[-1]
+    else:
+        return 0
+
+
+def win_loss_legacy(pos_df):
+    """多次过滤统计盈亏次数"""
+    return len(pos_df[pos_df.profit > 0]), len(pos_df[pos_df.profit <= 0])
+
+
+def win_loss(pos_df):
+    """一次统计盈亏次数"""
+    profit_sign = np.sign(pos_df['profit']).value_counts()
+    return int(profit_sign.get(1, 0)), int(profit_sign.get(0, 0) + profit_sign.get(-1, 0))
+
+
+def make_data(num: int, seed: int = 0):
+    """生成测试数据"""
+    rng = np.random.RandomState(seed)
+    trade_df = pd.DataFrame({
+        "order_type": rng.choice(["buy", "sell", "cancel"], num, p=[0.5, 0.45, 0.05]),
+        "traded": rng.randint(1, 100, num) * 100,
+        "trade_price": rng.uniform(1, 100, num).round(2),
+    })
+    assets_df = pd.DataFrame({
+        "assets": (1000000 + np.cumsum(rng.normal(0, 5000, num))).round(2)
+    })
+    pos_df = pd.DataFrame({
+        "profit": rng.normal(0, 1000, num).round(0)
+    })
+    return trade_df, assets_df, pos_df
+
+
+def timeit(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="报表统计性能测试")
+    parser.add_argument("--num", type=int, default=1000000, help="成交数量")
+    parser.add_argument("--legacy-num", type=int, default=100000, help="逐行计算使用的数量，逐行计算较慢")
+    args = parser.parse_args()
+
+    # 结果一致性检查，包含最后一个回撤区间未恢复的情况
+    trade_df, assets_df, pos_df = make_data(args.legacy_num)
+    for assets in (assets_df, assets_df.iloc[::-1].reset_index(drop=True), assets_df.iloc[:1]):
+        assert max_drawdown_cal(assets['assets'].values) == max_drawdown_legacy(assets)
+    np.testing.assert_array_equal(commission_cal(trade_df, COST, TAX), commission_legacy(trade_df))
+    assert win_loss(pos_df) == win_loss_legacy(pos_df)
+    print("结果一致")
+
+    # 耗时对比
+    print(f"逐行计算（{args.legacy_num}条）")
+    for name, func, data in (
+            ("手续费", commission_legacy, (trade_df,)),
+            ("最大回撤", max_drawdown_legacy, (assets_df,)),
+            ("盈亏次数", win_loss_legacy, (pos_df,)),
+    ):
+        print(f"    {name}: {timeit(func, *data)[1]:.3f}s")
+
+    trade_df, assets_df, pos_df = make_data(args.num)
+    print(f"向量化计算（{args.num}条）")
+    for name, func, data in (
+            ("手续费", commission_cal, (trade_df, COST, TAX)),
+            ("最大回撤", max_drawdown_cal, (assets_df['assets'].values,)),
+            ("盈亏次数", win_loss, (pos_df,)),
+    ):
+        print(f"    {name}: {timeit(func, *data)[1]:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
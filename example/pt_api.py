@@ -2,6 +2,8 @@
 import json
 import requests
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 import talib
 import numpy as np
@@ -13,10 +15,23 @@ from mpl_finance import candlestick_ohlc
 from matplotlib.pylab import date2num
 from matplotlib.dates import AutoDateLocator, DateFormatter
 
+from paper_trading.utility.statistics import ANNUAL_DAYS, commission_cal, max_drawdown_cal
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
 
 # 超时时间
 MARKET_TIMEOUT = 120
 
+# 连接池大小
+POOL_SIZE = 10
+
+# 连接失败时的重试次数，POST请求只在连接未建立时重试，避免重复下单
+MAX_RETRIES = 3
+
 
 class PaperTrading():
     """模拟交易"""
@@ -28,6 +43,9 @@ class PaperTrading():
         else:
             raise ConnectionError("地址或者端口不能为空")
 
+        # 保持长连接的会话
+        self.session = self.creat_session()
+
         # 连接模拟市场
         result, msg = self.connect()
         if not result:
@@ -64,10 +82,34 @@ class PaperTrading():
         """生成url"""
         return "/".join([self.home, method_name])
 
+    @staticmethod
+    def creat_session():
+        """创建使用连接池并自动重试的会话"""
+        retry = Retry(
+            total=MAX_RETRIES,
+            connect=MAX_RETRIES,
+            read=0,
+            status=MAX_RETRIES,
+            status_forcelist=(502, 503, 504),
+            backoff_factor=0.2
+        )
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def close(self):
+        """关闭会话"""
+        self.session.close()
+
     def connect(self):
         """连接模拟交易程序"""
         url = self.get_url("")
-        r = requests.get(url, timeout=MARKET_TIMEOUT)
+        try:
+            r = self.session.get(url, timeout=MARKET_TIMEOUT)
+        except requests.exceptions.RequestException:
+            return False, "模拟交易连接失败"
         if r.status_code == requests.codes.ok:
             return True, ""
         else:
@@ -76,10 +118,12 @@ class PaperTrading():
     def url_request(func):
         """请求函数的装饰器"""
         def wrapper(self, *args, **kwargs):
-            if not self.connect():
-                return False, "模拟交易服务连接失败"
-
-            r = func(self, *args, **kwargs)
+            try:
+                r = func(self, *args, **kwargs)
+            except requests.exceptions.RequestException:
+                # 请求失败时才检查服务连接
+                result, msg = self.connect()
+                return False, msg or "请求失败"
 
             if r.status_code == requests.codes.ok:
                 d = json.loads(r.text)
@@ -112,7 +156,7 @@ class PaperTrading():
         """
         url = self.get_url("login")
         data = {'token': token}
-        r = requests.post(url, data, timeout=MARKET_TIMEOUT)
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
         return r
 
     @url_request
@@ -129,7 +173,7 @@ class PaperTrading():
         info = json.dumps(info)
         info.encode("utf-8")
         data = {'info': info}
-        r = requests.post(url, data, timeout=MARKET_TIMEOUT)
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
 
         return r
 
@@ -141,7 +185,7 @@ class PaperTrading():
         """
         url = self.get_url("delete")
         data = {'token': self.__token}
-        r = requests.post(url, data, timeout=MARKET_TIMEOUT)
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
         return r
 
     @url_request
@@ -151,7 +195,7 @@ class PaperTrading():
         :return:(status, data)  正确时数据类型(bool, list) 错误时数据类型(bool, str)
         """
         url = self.get_url("list")
-        r = requests.get(url, timeout=MARKET_TIMEOUT)
+        r = self.session.get(url, timeout=MARKET_TIMEOUT)
         return r
 
     @url_request
@@ -162,7 +206,7 @@ class PaperTrading():
         """
         url = self.get_url("account")
         data = {'token': self.__token}
-        r = requests.post(url, data, timeout=MARKET_TIMEOUT)
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
         return r
 
     @url_request
@@ -173,7 +217,7 @@ class PaperTrading():
         """
         url = self.get_url("pos")
         data = {'token': self.__token}
-        r = requests.post(url, data, timeout=MARKET_TIMEOUT)
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
         return r
 
     @url_request
@@ -184,9 +228,58 @@ class PaperTrading():
         """
         url = self.get_url("orders")
         data = {'token': self.__token}
-        r = requests.post(url, data, timeout=MARKET_TIMEOUT)
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
+        return r
+
+    @url_request
+    def orders_page(self, start: str = None, end: str = None, cursor: str = None,
+                    limit: int = 1000, fields: list = None):
+        """
+        分页查询交割单信息
+        :param start:开始日期，例如20200101
+        :param end:结束日期，例如20200131
+        :param cursor:翻页游标，第一页为空，之后使用上一页返回的next_cursor
+        :param limit:每页数量
+        :param fields:需要返回的字段列表，为空时返回全部字段
+        :return:(status, data)  正确时数据类型(bool, dict) 错误时数据类型(bool, str)
+                 dict中orders为订单列表，next_cursor为下一页游标，没有下一页时为None
+        """
+        url = self.get_url("orders")
+        data = {'token': self.__token, 'limit': limit}
+        if start:
+            data['start_date'] = start
+        if end:
+            data['end_date'] = end
+        if cursor:
+            data['cursor'] = cursor
+        if fields:
+            data['fields'] = ",".join(fields)
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
         return r
 
+    def orders_export(self, start: str = None, end: str = None, fields: list = None):
+        """
+        流式导出交割单信息
+        :param start:开始日期，例如20200101
+        :param end:结束日期，例如20200131
+        :param fields:需要返回的字段列表，为空时返回全部字段
+        :return:订单生成器，每次返回一个dict格式订单
+        """
+        url = self.get_url("orders_export")
+        data = {'token': self.__token}
+        if start:
+            data['start_date'] = start
+        if end:
+            data['end_date'] = end
+        if fields:
+            data['fields'] = ",".join(fields)
+        with self.session.post(url, data, timeout=MARKET_TIMEOUT, stream=True) as r:
+            if r.status_code != requests.codes.ok:
+                raise ConnectionError("请求状态不正确")
+            for line in r.iter_lines():
+                if line:
+                    yield json.loads(line)
+
     @url_request
     def orders_today(self):
         """
@@ -195,7 +288,7 @@ class PaperTrading():
         """
         url = self.get_url("orders_today")
         data = {'token': self.__token}
-        r = requests.post(url, data, timeout=MARKET_TIMEOUT)
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
         return r
 
     @url_request
@@ -210,7 +303,21 @@ class PaperTrading():
             order.encode("utf-8")
         url = self.get_url("send")
         data = {"order": order}
-        r = requests.post(url, data, timeout=MARKET_TIMEOUT)
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
+        return r
+
+    @url_request
+    def order_send_batch(self, orders: list):
+        """
+        批量发单
+        :param orders:dict格式订单数据的列表
+        :return:(status, data)  正确时数据类型(bool, list) 错误时数据类型(bool, str)
+                 list中每个元素对应一个订单，成功时为{"order_id": 订单号}，失败时为{"error": 错误信息}
+        """
+        orders = json.dumps(orders)
+        url = self.get_url("send_batch")
+        data = {"orders": orders.encode("utf-8")}
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
         return r
 
     @url_request
@@ -222,7 +329,33 @@ class PaperTrading():
         """
         url = self.get_url("cancel")
         data = {'token': self.__token, "order_id": order_id}
-        r = requests.post(url, data, timeout=MARKET_TIMEOUT)
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
+        return r
+
+    @url_request
+    def order_cancel_batch(self, order_ids: list):
+        """
+        批量撤单
+        :param order_ids:订单ID列表
+        :return:(status, data)  正确时数据类型(bool, dict) 错误时数据类型(bool, str)
+        """
+        url = self.get_url("cancel_batch")
+        data = {'token': self.__token, "order_ids": json.dumps(order_ids)}
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
+        return r
+
+    @url_request
+    def order_cancel_all(self, symbol: str = None):
+        """
+        撤销所有未完成的订单
+        :param symbol:证券代码，例如600000.SH，为空时撤销账户所有未完成订单
+        :return:(status, data)  正确时数据类型(bool, dict) 错误时数据类型(bool, str)
+        """
+        url = self.get_url("cancel_all")
+        data = {'token': self.__token}
+        if symbol:
+            data['symbol'] = symbol
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
         return r
 
     @url_request
@@ -234,9 +367,32 @@ class PaperTrading():
         """
         url = self.get_url("status")
         data = {'token': self.__token, "order_id": order_id}
-        r = requests.post(url, data, timeout=MARKET_TIMEOUT)
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
         return r
 
+    def order_stream(self):
+        """
+        订阅账户推送，服务端需开启推送服务
+        :return:消息生成器，每次返回(消息类型, 数据)
+                 消息类型为order(订单更新)、status(订单状态更新)、account(账户资金更新)或overflow(有消息被丢弃)
+        """
+        url = self.get_url("stream")
+        params = {'token': self.__token}
+        with self.session.get(url, params=params, timeout=MARKET_TIMEOUT, stream=True) as r:
+            if r.status_code != requests.codes.ok:
+                raise ConnectionError("请求状态不正确")
+            if not r.headers.get("content-type", "").startswith("text/event-stream"):
+                raise ConnectionError(json.loads(r.text)["data"])
+
+            event = "message"
+            for line in r.iter_lines(decode_unicode=True):
+                if not line:
+                    event = "message"
+                elif line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    yield event, json.loads(line[5:])
+
     @url_request
     def liquidation(self, check_date: str, price_dict: dict):
         """
@@ -248,7 +404,35 @@ class PaperTrading():
         price_dict_data = json.dumps(price_dict)
         url = self.get_url("liquidation")
         data = {'token': self.__token, 'check_date': check_date, "price_dict": price_dict_data.encode("utf-8")}
-        r = requests.post(url, data, timeout=MARKET_TIMEOUT)
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
+        return r
+
+    @url_request
+    def liquidation_batch(self, check_date: str = None, price_dict: dict = None,
+                          price_df: pd.DataFrame = None, tokens: list = None):
+        """
+        批量清算，使用同一份收盘价格清算多个账户
+        :param check_date:清算日期，与price_dict一起使用
+        :param price_dict:清算时持仓清算价格
+        :param price_df:按日期范围依次清算时的收盘价格，index为清算日期，columns为证券代码，没有价格时为NaN
+        :param tokens:需要清算的账户列表，默认清算所有已登录的账户
+        :return:(status, data)  正确时数据类型(bool, dict) 错误时数据类型(bool, str)
+        """
+        url = self.get_url("liquidation_batch")
+        data = dict()
+        if price_df is not None:
+            price_df = price_df.astype(object).where(price_df.notna(), None)
+            data['price_matrix'] = json.dumps({
+                "dates": [str(d) for d in price_df.index],
+                "symbols": list(price_df.columns),
+                "prices": price_df.values.tolist()
+            })
+        else:
+            data['check_date'] = check_date
+            data['price_dict'] = json.dumps(price_dict)
+        if tokens is not None:
+            data['tokens'] = json.dumps(tokens)
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
         return r
 
     @url_request
@@ -259,7 +443,7 @@ class PaperTrading():
         """
         url = self.get_url("persistance")
         data = {'token': self.__token}
-        r = requests.post(url, data, timeout=MARKET_TIMEOUT)
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
         return r
 
     @url_request
@@ -282,7 +466,7 @@ class PaperTrading():
         """
         url = self.get_url("account_record")
         data = {'token': self.__token, 'start': start, 'end': end}
-        r = requests.post(url, data, timeout=MARKET_TIMEOUT)
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
         return r
 
     @url_request
@@ -295,9 +479,57 @@ class PaperTrading():
         """
         url = self.get_url("pos_record")
         data = {'token': self.__token, 'start': start, 'end': end}
-        r = requests.post(url, data, timeout=MARKET_TIMEOUT)
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
+        return r
+
+    @url_request
+    def report(self, start: str = None, end: str = None):
+        """
+        查询服务端计算的交易结果报表，统计口径与data_statistics一致，不需要下载交易记录
+        :param start:开始日期，为空时统计全部数据
+        :param end:结束日期，为空时统计全部数据
+        :return:(status, data)  正确时数据类型(bool, dict) 错误时数据类型(bool, str)
+        """
+        url = self.get_url("report")
+        data = {'token': self.__token}
+        if start:
+            data['start'] = start
+        if end:
+            data['end'] = end
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
+        return r
+
+    @url_request
+    def report_batch(self, tokens: list, start: str = None, end: str = None):
+        """
+        批量查询多个账户的交易结果报表，由服务端多进程计算
+        :param tokens:账户token列表
+        :return:(status, data)  正确时数据类型(bool, list) 错误时数据类型(bool, str)
+        """
+        url = self.get_url("report_batch")
+        data = {'tokens': json.dumps(tokens)}
+        if start:
+            data['start'] = start
+        if end:
+            data['end'] = end
+        r = self.session.post(url, data, timeout=MARKET_TIMEOUT)
         return r
 
+    def get_report_table(self, tokens: list, start: str = None, end: str = None, save_data=False):
+        """
+        获取多个账户的报表对比表
+        :return:dataframe数据，每行为一个账户
+        """
+        status, reports = self.report_batch(tokens, start, end)
+        if not status:
+            raise ValueError(reports)
+
+        report_df = pd.DataFrame(reports).set_index("account_id")
+        if save_data:
+            self.downloader(report_df, start, end, "report_batch.xls")
+
+        return report_df
+
     def get_assets_record(self, start, end, save_data=False):
         """
         获取逐日资产记录
@@ -357,20 +589,11 @@ class PaperTrading():
         if status:
             if isinstance(trade_record, list):
                 trade_df = pd.DataFrame(trade_record)
-                trade_df = trade_df[trade_df['status'] == "全部成交"]
-                trade_df['commission'] = 0.
+                # 有成交的订单，包括部分成交后撤单的订单
+                trade_df = trade_df[trade_df['traded'] > 0].copy()
 
                 # 计算commission
-                for i, row in trade_df.iterrows():
-                    commission = 0.
-                    if row['order_type'] == "buy":
-                        commission = row['traded'] * row['trade_price'] * self.__cost
-                    elif row['order_type'] == "sell":
-                        commission = row['traded'] * row['trade_price'] * (self.__cost + self.__tax)
-                    else:
-                        pass
-
-                    trade_df.loc[i, 'commission'] = commission
+                trade_df['commission'] = commission_cal(trade_df, self.__cost, self.__tax)
 
                 trade_df = trade_df[['order_date', 'order_time', 'pt_symbol', 'order_type', 'price_type', 'order_price', 'trade_price', 'volume', 'traded', 'status', 'commission', 'status', 'trade_type','account_id', 'error_msg']]
                 if save_data:
@@ -389,31 +612,34 @@ class PaperTrading():
         end_date = assets_df.iloc[-1]['check_date']
 
         total_days = len(assets_df)
-        profit_days = len(assets_df[assets_df["net_pnl"] > 0])
-        loss_days = len(assets_df[assets_df["net_pnl"] < 0])
+        pnl_sign = np.sign(assets_df["net_pnl"]).value_counts()
+        profit_days = int(pnl_sign.get(1, 0))
+        loss_days = int(pnl_sign.get(-1, 0))
 
-        end_balance = float(assets_df.iloc[-1].assets)
+        assets = assets_df['assets'].values
+        end_balance = float(assets[-1])
 
-        max_drawdown = self.max_drapdown_cal(assets_df)
-        max_ddpercent = round((max_drawdown / assets_df['assets'].max()) * 100, 2)
+        max_drawdown = max_drawdown_cal(assets)
+        max_ddpercent = round((max_drawdown / assets.max()) * 100, 2)
 
         total_net_pnl = round((end_balance - self.__capital), 2)
         total_commission = float(trade_df['commission'].sum())
         total_slippage = 0
-        total_turnover = float(trade_df['volume'].sum())
+        total_turnover = float(trade_df['traded'].sum())
         total_trade_count = len(trade_df)
 
-        win_num = len(pos_df[pos_df.profit > 0])
-        loss_num = len(pos_df[pos_df.profit <= 0])
+        profit_sign = np.sign(pos_df['profit']).value_counts()
+        win_num = int(profit_sign.get(1, 0))
+        loss_num = int(profit_sign.get(0, 0) + profit_sign.get(-1, 0))
         win_rate = round((win_num / (win_num + loss_num) * 100), 2)
 
         total_return = round(((end_balance / self.__capital - 1) * 100), 2)
-        annual_return = round((total_return / total_days * 240), 2)
+        annual_return = round((total_return / total_days * ANNUAL_DAYS), 2)
         return_mean = pos_df['profit'].mean()
         return_std = pos_df['profit'].std()
 
         if return_std:
-            sharpe_ratio = float(return_mean / return_std * np.sqrt(240))
+            sharpe_ratio = float(return_mean / return_std * np.sqrt(ANNUAL_DAYS))
         else:
             sharpe_ratio = 0
 
@@ -657,34 +883,112 @@ class PaperTrading():
 
     def max_drapdown_cal(self, assets_df):
         """最大回撤计算"""
-        drawdown_list = list()
-        assets_list = list()
-        base_data = 0
-        for i, row in assets_df.iterrows():
-            # 资产增长
-            if base_data <= row['assets']:
-                if assets_list:
-                    assets_list.append(base_data)
-                    assets_list.sort()
-                    assets_diff = assets_list[-1] - assets_list[0]
-                    drawdown_list.append(assets_diff)
-                    assets_list.clear()
-                base_data = row['assets']
-            # 资产减少
-            else:
-                assets_list.append(row['assets'])
-
-        if drawdown_list:
-            drawdown_list.sort()
-            return drawdown_list[-1]
-        else:
-            return 0
+        return max_drawdown_cal(assets_df['assets'].values)
 
     @staticmethod
     def output(msg):
         print(f"{datetime.now()}\t{msg}")
 
 
+class AsyncPaperTrading():
+    """
+    异步模拟交易客户端，需要安装httpx（pip install paper_trading[async]）
+    使用异步连接池，可以同时保持大量未完成的请求，例如：
+        async with AsyncPaperTrading(url, port, token) as pt:
+            results = await asyncio.gather(*[pt.order_send(order) for order in orders])
+    """
+
+    def __init__(self, url: str = "", port: str = "", token: str = None, max_connections: int = 100):
+        """构造函数"""
+        if httpx is None:
+            raise ImportError("异步客户端需要安装httpx：pip install paper_trading[async] 或 pip install httpx")
+        if url and port:
+            self.home = ':'.join([url, port])
+        else:
+            raise ConnectionError("地址或者端口不能为空")
+
+        self.token = token
+        self.client = httpx.AsyncClient(
+            timeout=MARKET_TIMEOUT,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            # 只在连接未建立时重试，避免重复下单
+            transport=httpx.AsyncHTTPTransport(retries=MAX_RETRIES)
+        )
+
+    async def __aenter__(self):
+        status, account = await self.login(self.token)
+        if not status:
+            await self.close()
+            raise ValueError("账户不存在")
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """关闭连接池"""
+        await self.client.aclose()
+
+    def get_url(self, method_name: str):
+        """生成url"""
+        return "/".join([self.home, method_name])
+
+    async def request(self, method_name: str, data: dict):
+        """
+        发送请求
+        :return:(status, data)
+        """
+        try:
+            r = await self.client.post(self.get_url(method_name), data=data)
+        except httpx.HTTPError:
+            return False, "模拟交易服务连接失败"
+
+        if r.status_code == 200:
+            d = r.json()
+            return d["status"], d["data"]
+        else:
+            return False, "请求状态不正确"
+
+    async def login(self, token: str):
+        """账户登录"""
+        status, account = await self.request("login", {'token': token})
+        if status:
+            self.token = account['account_id']
+        return status, account
+
+    async def account(self):
+        """查询账户信息"""
+        return await self.request("account", {'token': self.token})
+
+    async def pos(self):
+        """查询持仓信息"""
+        return await self.request("pos", {'token': self.token})
+
+    async def orders_today(self):
+        """查询当日订单"""
+        return await self.request("orders_today", {'token': self.token})
+
+    async def order_send(self, order: dict):
+        """发单"""
+        return await self.request("send", {"order": json.dumps(order)})
+
+    async def order_send_batch(self, orders: list):
+        """批量发单"""
+        return await self.request("send_batch", {"orders": json.dumps(orders)})
+
+    async def order_cancel(self, order_id: str):
+        """撤单"""
+        return await self.request("cancel", {'token': self.token, "order_id": order_id})
+
+    async def order_cancel_batch(self, order_ids: list):
+        """批量撤单"""
+        return await self.request("cancel_batch", {'token': self.token, "order_ids": json.dumps(order_ids)})
+
+    async def order_status(self, order_id: str):
+        """查询订单状态"""
+        return await self.request("status", {'token': self.token, "order_id": order_id})
+
+
 if __name__ == "__main__":
     pass
 
@@ -0,0 +1,165 @@
+
+import json
+import struct
+import socket
+from itertools import count
+from threading import Thread, Lock
+from concurrent.futures import Future
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# 帧头，4字节大端无符号整数表示消息体长度
+HEADER = struct.Struct(">I")
+
+# 超时时间
+GATEWAY_TIMEOUT = 120
+
+
+class PaperTradingGateway():
+    """
+    模拟交易订单网关客户端
+    通过长连接发送订单，发送后立即返回Future，不需要等待上一个订单的回复，
+    成交、订单状态及账户资金变化通过on_push回调异步接收
+    """
+
+    def __init__(self, host: str = "", port: int = 0, unix_path: str = "", on_push=None):
+        """
+        构造函数
+        :param host:网关地址
+        :param port:网关端口
+        :param unix_path:Unix socket路径，不为空时使用Unix socket连接
+        :param on_push:推送回调函数，参数为(消息类型, 数据)，
+                       消息类型为order(订单更新)、status(订单状态更新)、account(账户资金更新)或overflow(有消息被丢弃)
+        """
+        if unix_path:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(unix_path)
+        elif host and port:
+            self.sock = socket.create_connection((host, port), timeout=GATEWAY_TIMEOUT)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            raise ConnectionError("地址或者端口不能为空")
+        self.sock.settimeout(None)
+
+        # 协商编码方式，优先使用msgpack
+        self.sock.sendall(b"M" if msgpack else b"J")
+        codec = self.sock.recv(1)
+        if codec == b"M":
+            self.encode = lambda obj: msgpack.packb(obj, use_bin_type=True)
+            self.decode = lambda data: msgpack.unpackb(data, raw=False)
+        elif codec == b"J":
+            self.encode = lambda obj: json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.decode = json.loads
+        else:
+            raise ConnectionError("订单网关连接失败")
+
+        self.on_push = on_push
+        self.token = None
+        self._seq = count(1)
+        self._futures = dict()
+        self._send_lock = Lock()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """关闭连接"""
+        self.sock.close()
+        self._thread.join()
+
+    def _request(self, msgs: list):
+        """发送一组消息，返回对应的Future列表"""
+        futures = list()
+        frames = list()
+        with self._send_lock:
+            for msg in msgs:
+                msg["seq"] = next(self._seq)
+                future = Future()
+                self._futures[msg["seq"]] = future
+                futures.append(future)
+                body = self.encode(msg)
+                frames.append(HEADER.pack(len(body)) + body)
+            self.sock.sendall(b"".join(frames))
+
+        return futures
+
+    def _run(self):
+        """接收回复及推送"""
+        buf = bytearray()
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except OSError:
+                break
+            if not data:
+                break
+            buf += data
+
+            pos = 0
+            while len(buf) - pos >= HEADER.size:
+                size, = HEADER.unpack_from(buf, pos)
+                if len(buf) - pos - HEADER.size < size:
+                    break
+                start = pos + HEADER.size
+                self._on_message(self.decode(bytes(buf[start:start + size])))
+                pos = start + size
+            del buf[:pos]
+
+        # 连接断开，未完成的请求全部失败
+        for future in self._futures.values():
+            future.set_exception(ConnectionError("订单网关连接断开"))
+        self._futures.clear()
+
+    def _on_message(self, msg: dict):
+        """处理收到的消息"""
+        op = msg.get("op")
+        if op == "ack":
+            future = self._futures.pop(msg["seq"], None)
+            if future:
+                future.set_result((msg["status"], msg["data"]))
+        elif op == "pong":
+            future = self._futures.pop(msg["seq"], None)
+            if future:
+                future.set_result((True, "pong"))
+        elif self.on_push:
+            self.on_push(op, msg.get("data"))
+
+    def login(self, token: str):
+        """
+        账户登录，登录后开始接收该账户的推送
+        :return:(status, data)  正确时数据类型(bool, dict) 错误时数据类型(bool, str)
+        """
+        status, data = self._request([{"op": "login", "token": token}])[0].result(GATEWAY_TIMEOUT)
+        if status:
+            self.token = token
+        return status, data
+
+    def order_send(self, order: dict):
+        """
+        发单，不等待回复
+        :param order:dict格式订单数据
+        :return:Future，结果为(status, data)  正确时数据类型(bool, dict) 错误时数据类型(bool, str)
+        """
+        return self._request([{"op": "send", "order": order}])[0]
+
+    def order_send_batch(self, orders: list):
+        """
+        批量发单，所有订单合并为一次网络写入
+        :param orders:dict格式订单数据的列表
+        :return:Future列表
+        """
+        return self._request([{"op": "send", "order": order} for order in orders])
+
+    def order_cancel(self, order_id: str):
+        """
+        撤单，不等待回复
+        :return:Future，结果为(status, data)
+        """
+        return self._request([{"op": "cancel", "order_id": order_id}])[0]
+
+    def ping(self):
+        """检查连接"""
+        return self._request([{"op": "ping"}])[0].result(GATEWAY_TIMEOUT)
@@ -24,6 +24,9 @@ def main():
     # 模拟交易flask配置参数
     config_name = ConfigType.DEFAULT.value
 
+    # 服务模式，默认使用flask自带的服务器，参数中包含asgi时使用uvicorn启动ASGI服务
+    asgi_mode = "asgi" in sys.argv[1:]
+
     # 获取命令行输入的参数，判断启动何种模式的引擎
     if len(sys.argv) > 1:
         if sys.argv[1] == "test":
@@ -50,7 +53,17 @@ def main():
         debug = config[config_name].DEBUG
         app = creat_app(config_name, engine)
 
-        app.run(host=host, port=port, debug=debug)
+        if asgi_mode:
+            try:
+                import uvicorn
+            except ImportError:
+                raise ImportError("ASGI模式需要安装uvicorn：pip install uvicorn")
+            from paper_trading.app.asgi import creat_asgi_app
+
+            asgi_app = creat_asgi_app(app, engine, config[config_name].ASGI_WORKERS)
+            uvicorn.run(asgi_app, host=host, port=port, log_level="warning")
+        else:
+            app.run(host=host, port=port, debug=debug)
 
 if __name__ == "__main__":
     main()
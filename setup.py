@@ -21,6 +21,10 @@ setup(
         'mongodb',
         'tushare'
     ],
+    extras_require={
+        # 异步客户端example/pt_api.py中的AsyncPaperTrading
+        'async': ['httpx'],
+    },
     license='MIT License',
     zip_safe=False,
     classifiers=[
@@ -12,4 +12,12 @@ def init_tasks(app, engine):
         hour=15,
         minute=10
     )
+    # 同步交易日历并更新引擎中的日历
+    scheduler.add_job(
+        engine.sync_calendar,
+        "cron",
+        day=1,
+        hour=8,
+        minute=0
+    )
     scheduler.start()
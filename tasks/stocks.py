@@ -1,4 +1,5 @@
 import logging
+from datetime import datetime
 
 from pymongo import UpdateOne
 from pytdx.hq import TdxHq_API
@@ -39,3 +40,40 @@ def sync_data():
                 n += 1
             if batch_list:
                 collection.bulk_write(batch_list, ordered=False)
+
+
+def sync_trade_cal():
+    """
+    将交易日历更新到数据库，更新上一年至下一年年底的数据
+    :return: 写入的天数
+    """
+    from paper_trading.api.tushare_api import TushareService
+
+    if not SETTINGS.get('TUSHARE_TOKEN'):
+        logging.warning("未配置TUSHARE_TOKEN，跳过交易日历更新")
+        return 0
+
+    host = SETTINGS.get('MONGO_HOST', "localhost")
+    port = SETTINGS.get('MONGO_PORT', 27017)
+    ms = MongoDBService(host, port)
+    ms.connect_db()
+    collection = ms.db_client["stocks"]["trade_cal"]
+
+    ts = TushareService()
+    ts.connect_api()
+    year = datetime.now().year
+    df = ts.get_trade_cal(f"{year - 1}0101", f"{year + 1}1231")
+    batch_list = [
+        UpdateOne(
+            {"cal_date": row.cal_date},
+            {"$set": {"cal_date": row.cal_date, "is_open": int(row.is_open)}},
+            upsert=True,
+        )
+        for row in df.itertuples()
+    ]
+    if batch_list:
+        collection.bulk_write(batch_list, ordered=False)
+        collection.create_index("cal_date")
+    ms.close()
+    logging.warning(f"trade_cal: {len(batch_list)} days write to db")
+    return len(batch_list)
@@ -1,6 +1,12 @@
 
 import copy
 import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from functools import wraps
+from itertools import count
+from threading import Lock, RLock
+
 import pandas as pd
 
 from paper_trading.event import Event
@@ -22,6 +28,7 @@ from paper_trading.utility.constant import (
     LoadDataMode
 )
 from paper_trading.utility.model import (
+    FrozenDict,
     Account,
     AccountRecord,
     Position,
@@ -34,6 +41,58 @@ from paper_trading.utility.model import (
 P = SETTINGS["POINT"]
 
 
+# 交易员实例编号，账户重新登录后与之前的数据版本号区分
+_generations = count(1)
+
+# 订单编号生成锁
+_order_id_lock = Lock()
+_last_order_id = 0                  # 上一个订单编号的微秒时间戳
+_order_id_node = 0                  # 进程编号，主进程为0，账户分片进程为分片序号加1
+
+
+def set_order_id_node(node: int):
+    """设置订单编号中的进程编号，多个进程同时生成订单编号时保证全局唯一"""
+    global _order_id_node
+    _order_id_node = node
+
+
+def new_order_id():
+    """
+    生成订单编号，使用微秒时间戳并保证单调递增，避免批量下单时编号重复；
+    时间戳后附加两位进程编号，不同分片进程同一时刻生成的编号不重复，编号按字符串排序即为时间顺序
+    """
+    global _last_order_id
+    with _order_id_lock:
+        t = time.time_ns() // 1000
+        if t <= _last_order_id:
+            t = _last_order_id + 1
+        _last_order_id = t
+
+    return f"{t // 1000000}.{t % 1000000:06d}{_order_id_node:02d}"
+
+
+def synchronized(func):
+    """
+    交易员数据修改装饰器
+    持有账户锁执行修改，并在修改前后各增加一次版本号，
+    版本号为奇数时表示数据正在被修改，供无锁读取时校验
+    """
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            self._write_depth += 1
+            if self._write_depth == 1:
+                self.version += 1
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                if self._write_depth == 1:
+                    self.version += 1
+                self._write_depth -= 1
+
+    return wrapper
+
+
 class Trader:
     """交易员"""
 
@@ -42,10 +101,16 @@ class Trader:
                  account_dict: dict,
                  pst_active,
                  load_data_mode,
-                 db):
-        """构造函数"""
+                 db,
+                 data: dict = None):
+        """
+        构造函数
+        :param data: 批量预加载的数据，格式为{'pos': [], 'orders': [], 'pos_record': []}，
+                     交易模式下传入时不再逐个账户查询数据库
+        """
         self.event_engine = event_engine            # 事件引擎
         self.__pst_active = pst_active              # 数据持久化开关
+        self.__pst_deferred = False                 # 暂停逐条持久化，由调用方批量持久化
         account = account_generate(account_dict)
         self.token = account.account_id
         self.account = account
@@ -53,13 +118,23 @@ class Trader:
         self.pos = dict()                           # 持仓数据
         self.orders = dict()                        # 订单数据
         self.orders_today = dict()                  # 今日订单数据
+        self.order_dates = dict()                   # 订单日期索引 {日期: [订单ID]}
+        self.order_date_list = list()               # 排序的订单日期列表
+        self.orders_since = None                    # 内存订单完整的起始日期，None表示全部订单都在内存中
         self.account_record = pd.DataFrame()        # 账户记录
         self.pos_record = pd.DataFrame()            # 持仓记录
 
+        self.lock = RLock()                         # 账户锁，所有修改操作串行执行
+        self.version = 0                            # 数据版本号
+        self.generation = next(_generations)        # 交易员实例编号
+        self._write_depth = 0                       # 修改操作嵌套层数
+        self._views = dict()                        # 按版本缓存的数据快照
+        self.report = None                          # 报表累加器，首次查询报表时初始化
+
         # 加载数据
-        self.__load_data(load_data_mode, db)
+        self.__load_data(load_data_mode, db, data)
 
-    def __load_data(self, load_data_mode, db):
+    def __load_data(self, load_data_mode, db, data=None):
         """加载数据"""
         # 新建模式：不用加载数据
         if load_data_mode == LoadDataMode.CREAT:
@@ -72,12 +147,40 @@ class Trader:
             self.__load_pos_records(db)
         # 交易模式：加载当前持仓，当日的订单及未清仓的持仓记录
         elif load_data_mode == LoadDataMode.TRADING:
-            self.__load_pos(db)
-            self.__load_today_orders(db)
-            self.__load_pos_records_not_clear(db)
+            self.orders_since = datetime.now().strftime("%Y%m%d")
+            if data is not None:
+                self.__load_preloaded(data)
+            else:
+                self.__load_pos(db)
+                self.__load_today_orders(db)
+                self.__load_pos_records_not_clear(db)
         else:
             raise ValueError("数据加载模式错误")
 
+    def __load_preloaded(self, data: dict):
+        """加载批量查询得到的数据"""
+        for d in data.get('pos', []):
+            pos = pos_generate(d)
+            self.pos[pos.pt_symbol] = pos
+
+        for d in data.get('orders', []):
+            order = order_generate(d)
+            self.__add_order(order)
+
+        pos_record = data.get('pos_record')
+        if pos_record:
+            self.pos_record = pd.DataFrame(pos_record, index=[i for i in range(len(pos_record))])
+
+    def __add_order(self, order: Order):
+        """添加订单并更新订单日期索引"""
+        self.orders[order.order_id] = order
+
+        order_ids = self.order_dates.get(order.order_date)
+        if order_ids is None:
+            order_ids = self.order_dates[order.order_date] = list()
+            insort(self.order_date_list, order.order_date)
+        order_ids.append(order.order_id)
+
     def __load_pos(self, db):
         """加载持仓"""
         data = query_position(self.token, db)
@@ -92,7 +195,7 @@ class Trader:
         if isinstance(data, list):
             for d in data:
                 order = order_generate(d)
-                self.orders[order.order_id] = order
+                self.__add_order(order)
 
     def __load_today_orders(self, db):
         """加载当日订单"""
@@ -100,7 +203,7 @@ class Trader:
         if isinstance(data, list):
             for d in data:
                 order = order_generate(d)
-                self.orders[order.order_id] = order
+                self.__add_order(order)
 
     def __load_account_records(self, db):
         """加载账户记录"""
@@ -120,13 +223,106 @@ class Trader:
         if pos_record:
              self.pos_record = pd.DataFrame(pos_record, index=[i for i in range(len(pos_record))])
 
+    def snapshot(self, reader):
+        """
+        无锁读取一致的数据快照
+        读取前后版本号一致且不在修改中时，读取的数据才是一致的，否则重新读取
+        :param reader: 读取并复制数据的函数
+        :return: (版本号, 数据)
+        """
+        while True:
+            version = self.version
+            if not version % 2:
+                try:
+                    data = reader()
+                except (RuntimeError, KeyError):
+                    # 读取过程中数据被修改
+                    pass
+                else:
+                    if version == self.version:
+                        return version, data
+            time.sleep(0)
+
+    def view(self, name: str, reader):
+        """
+        获取只读数据快照
+        快照按版本号缓存，账户数据没有变化时直接返回缓存，不再重新生成
+        :param name: 快照名称
+        :param reader: 生成快照的函数
+        """
+        cached = self._views.get(name)
+        if cached and cached[0] == self.version:
+            return cached[1]
+
+        version, data = self.snapshot(reader)
+        self._views[name] = (version, data)
+        return data
+
+    def read_account(self):
+        """读取账户数据"""
+        return self.view("account", lambda: FrozenDict(self.account.__dict__))
+
+    def read_pos(self):
+        """读取持仓数据"""
+        return self.view(
+            "pos",
+            lambda: tuple(FrozenDict(p.__dict__) for p in self.pos.copy().values())
+        )
+
+    def read_orders(self):
+        """读取订单数据"""
+        return self.view(
+            "orders",
+            lambda: tuple(FrozenDict(o.__dict__) for o in self.orders.copy().values())
+        )
+
+    def covers(self, start: str = None):
+        """从start日期开始的订单是否完整的保存在内存中"""
+        if self.orders_since is None:
+            return True
+        return bool(start) and start >= self.orders_since
+
+    def read_order_status(self, order_id: str):
+        """读取订单状态，订单不在内存中时返回None"""
+        order = self.orders.get(order_id)
+        if order:
+            return order.status
+
+    def read_orders_by_date(self, start: str = None, end: str = None):
+        """通过订单日期索引读取日期范围内的订单"""
+        def reader():
+            dates = self.order_date_list
+            lo = bisect_left(dates, start) if start else 0
+            hi = bisect_right(dates, end) if end else len(dates)
+            orders = list()
+            for date in dates[lo:hi]:
+                for order_id in self.order_dates[date]:
+                    orders.append(FrozenDict(self.orders[order_id].__dict__))
+            return orders
+
+        if not start and not end:
+            return list(self.read_orders())
+
+        version, data = self.snapshot(reader)
+        return data
+
+    def read_account_record(self):
+        """读取账户记录，返回的DataFrame为共享快照，不能原地修改"""
+        return self.view("account_record", lambda: self.account_record.copy())
+
+    def read_pos_record(self):
+        """读取持仓记录，返回的DataFrame为共享快照，不能原地修改"""
+        return self.view("pos_record", lambda: self.pos_record.copy())
+
     def __make_event(self, event_name, data):
-        """制造事件"""
-        if self.__pst_active:
+        """制造事件，开启推送服务时推送事件不受持久化开关限制"""
+        pst = self.__pst_active and not self.__pst_deferred
+        if pst or (SETTINGS['PUSH_ACTIVE'] and event_name in PUSH_EVENTS):
             new_data = copy.deepcopy(data)
             event = Event(event_name, new_data)
             self.event_engine.put(event)
 
+    @synchronized
     def on_orders_arrived(self, order: Order):
         """订单到达"""
         # 接收订单前的验证
@@ -136,7 +332,7 @@ class Trader:
                 return result, msg
 
         # 生成订单ID
-        order.order_id = str(time.time())
+        order.order_id = new_order_id()
 
         # 补充订单信息
         if order.order_price == 0:
@@ -144,23 +340,46 @@ class Trader:
         else:
             order.price_type = PriceType.LIMIT.value
 
-        self.orders[order.order_id] = order
+        self.__add_order(order)
 
         # 推送订单保存事件
         self.__make_event(EVENT_ORDER_INSERT, order)
 
         return True, order
 
-    def on_order_deal(self, order: Order):
-        """订单成交处理"""
+    @synchronized
+    def on_orders_arrived_batch(self, orders: list):
+        """批量订单到达，所有订单在一次加锁中完成验证和资金冻结"""
+        return [self.on_orders_arrived(order) for order in orders]
+
+    @synchronized
+    def on_order_deal(self, order: Order, volume: float = None, price: float = None):
+        """
+        订单成交处理
+        :param order: 订单，traded及trade_price为累计成交数量及成交均价
+        :param volume: 本次成交数量，为None时订单一次全部成交
+        :param price: 本次成交价格
+        """
+        # 部分成交时按本次成交的数量及价格更新持仓和账户
+        deal = order
+        if volume is not None:
+            deal = copy.copy(order)
+            deal.volume = volume
+            deal.traded = volume
+            deal.trade_price = price
+
         # 买入处理
         if order.order_type == OrderType.BUY.value:
-            pos_val_diff = self.__on_position_append(order)
-            self.__on_account_buy(order, pos_val_diff)
+            pos_val_diff = self.__on_position_append(deal)
+            self.__on_account_buy(deal, pos_val_diff)
         # 卖出处理
         else:
-            pos_val_diff = self.__on_position_reduce(order)
-            self.__on_account_sell(order, pos_val_diff)
+            pos_val_diff = self.__on_position_reduce(deal)
+            self.__on_account_sell(deal, pos_val_diff)
+
+        # 每次成交计入报表，成交笔数在订单第一次成交时增加
+        if self.report:
+            self.report.on_trade(order.order_type, deal.traded, deal.trade_price, deal.traded == order.traded)
 
         if order.volume == order.traded:
             order.status = Status.ALLTRADED.value
@@ -174,11 +393,13 @@ class Trader:
         # 订单更新事件
         self.__make_event(EVENT_ORDER_UPDATE, order)
 
+    @synchronized
     def on_order_cancel(self, order: Order):
         """取消订单"""
         order.status = Status.CANCELLED.value
         self.on_order_refuse(order)
 
+    @synchronized
     def on_order_refuse(self, order: Order):
         """拒绝订单"""
         # 更新订单
@@ -198,6 +419,7 @@ class Trader:
         else:
             return self.__on_sell_cancel(self.orders[order.order_id])
 
+    @synchronized
     def on_order_status_update(self, order: Order):
         """更新订单状态信息"""
         self.orders[order.order_id].status = order.status
@@ -314,6 +536,8 @@ class Trader:
         )
         df = pd.DataFrame(pos_record.__dict__, index=[len(self.pos_record)])
         self.pos_record = self.pos_record.append(df)
+        if self.report:
+            self.report.on_pos_profit(None, pos_record.profit)
 
         # 推送持仓记录新建事件
         self.__make_event(EVENT_POS_RECORD_INSERT, pos_record)
@@ -358,6 +582,8 @@ class Trader:
             index = self.pos_record.loc[(self.pos_record['pt_symbol']==order.pt_symbol) & (self.pos_record['is_clear']==0)].index.tolist()
             if index:
                 i = index[0]
+                if self.report:
+                    self.report.on_pos_profit(float(self.pos_record.loc[i, 'profit']), profit)
                 self.pos_record.loc[i, 'max_vol'] = volume
                 self.pos_record.loc[i, 'buy_price_mean'] = buy_price
                 self.pos_record.loc[i, 'profit'] = profit
@@ -409,6 +635,8 @@ class Trader:
             max_vol = int(self.pos_record.loc[i, 'max_vol'])
             sell_price_mean = float(self.pos_record.loc[i, 'sell_price_mean'])
             new_sell_price_mean = sell_price_mean + ((order.volume / max_vol) * now_price)
+            if self.report:
+                self.report.on_pos_profit(float(self.pos_record.loc[i, 'profit']), profit)
             self.pos_record.loc[i, 'sell_price_mean'] = new_sell_price_mean
             self.pos_record.loc[i, 'last_sell_date'] = order.order_date
             self.pos_record.loc[i, 'profit'] = profit
@@ -425,6 +653,7 @@ class Trader:
 
         return pos_val_diff
 
+    @synchronized
     def on_position_update_price(self, pos, price: float):
         """更新持仓价格"""
         volume = pos.volume
@@ -576,7 +805,45 @@ class Trader:
 
     """清算"""
 
-    def on_liquidation(self, liq_date: str, price_dict: dict = None):
+    @synchronized
+    def on_liquidation(self, liq_date: str, price_dict: dict = None, bulk: bool = False):
+        """
+        清算
+        :param bulk: 批量持久化，清算过程中不产生逐条的持久化事件，
+                     返回清算后需要持久化的数据，由调用方一次写入数据库
+        """
+        if bulk:
+            symbols = list(self.pos.keys())
+            self.__pst_deferred = True
+            try:
+                self.__on_liquidation(liq_date, price_dict)
+            finally:
+                self.__pst_deferred = False
+
+            if not self.__pst_active:
+                return True
+
+            return {
+                'account': {
+                    'token': self.token,
+                    'avl': self.account.available,
+                    'market_value': self.account.market_value,
+                    'assets': self.account.assets
+                },
+                'pos': [copy.copy(pos) for pos in self.pos.values()],
+                'cleared': [symbol for symbol in symbols if symbol not in self.pos],
+                'records': [AccountRecord(
+                    account_id=self.token,
+                    check_date=liq_date,
+                    assets=self.account.assets,
+                    available=self.account.available,
+                    market_value=self.account.market_value
+                )]
+            }
+
+        return self.__on_liquidation(liq_date, price_dict)
+
+    def __on_liquidation(self, liq_date: str, price_dict: dict = None):
         """清算"""
         # 更新所有持仓最新价格并冻结证券，并更新市值
         self.__on_position_liquidation(price_dict)
@@ -594,6 +861,8 @@ class Trader:
         )
         df = pd.DataFrame(account_daily.__dict__, index=[liq_date])
         self.account_record = self.account_record.append(df)
+        if self.report:
+            self.report.on_account_record(liq_date, self.account.assets)
 
         # 推送账户记录创建事件
         self.__make_event(EVENT_ACCOUNT_RECORD_INSERT, account_daily)
@@ -0,0 +1,68 @@
+
+import traceback
+from threading import Lock
+from collections import deque
+from concurrent.futures import Future
+
+from paper_trading.event import Event
+from paper_trading.utility.event import EVENT_ERROR
+from paper_trading.utility.setting import SETTINGS
+
+
+class TraderActor:
+    """
+    交易员Actor
+    所有对交易员的修改以消息的形式放入邮箱，由工作线程池处理，
+    同一时间只有一个工作线程处理同一个交易员的邮箱，
+    积压的消息在一次加锁中批量处理
+    """
+
+    def __init__(self, trader, pool):
+        self.trader = trader                # 交易员
+        self.pool = pool                    # 工作线程池
+        self.mailbox = deque()              # 邮箱
+        self._lock = Lock()                 # 邮箱锁
+        self._scheduled = False             # 是否已提交到线程池
+
+    def tell(self, method: str, *args):
+        """
+        发送消息
+        :param method: 交易员的方法名
+        :param args: 方法参数
+        :return: Future
+        """
+        future = Future()
+        with self._lock:
+            self.mailbox.append((method, args, future))
+            if self._scheduled:
+                return future
+            self._scheduled = True
+
+        self.pool.submit(self._drain)
+        return future
+
+    def _drain(self):
+        """处理邮箱中的消息"""
+        batch = list()
+        with self._lock:
+            for i in range(min(len(self.mailbox), SETTINGS['ACTOR_BATCH'])):
+                batch.append(self.mailbox.popleft())
+
+        with self.trader.lock:
+            for method, args, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(getattr(self.trader, method)(*args))
+                except Exception as e:
+                    future.set_exception(e)
+                    event = Event(EVENT_ERROR, traceback.format_exc())
+                    self.trader.event_engine.put(event)
+
+        # 还有未处理的消息时重新提交，避免一个账户长期占用工作线程
+        with self._lock:
+            if not self.mailbox:
+                self._scheduled = False
+                return
+
+        self.pool.submit(self._drain)
@@ -1,12 +1,19 @@
 
+import heapq
 import logging
+import traceback
+from itertools import islice
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from paper_trading.utility.model import LogData
 from paper_trading.utility.constant import Status, LoadDataMode
 from paper_trading.event import Event
 from paper_trading.utility.event import *
 from paper_trading.trade.db_model import *
-from paper_trading.trade.account import Trader, order_generate
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.trade.account import Trader
+from paper_trading.trade.account_actor import TraderActor
+from paper_trading.trade.report_builder import ReportAccumulator, build_report, filter_records
 
 
 class AccountEngine():
@@ -26,6 +33,15 @@ class AccountEngine():
         # 交易账户字典
         self.trader_dict = dict()               # 交易账户字典
 
+        # 已创建订单索引的账户
+        self.indexed_tokens = set()
+
+        # Actor模式
+        self.actor_dict = dict()                # 交易员Actor字典
+        self.actor_pool = None                  # Actor工作线程池
+        if SETTINGS.get('ACCOUNT_ACTOR'):
+            self.actor_pool = ThreadPoolExecutor(max_workers=SETTINGS['ACTOR_WORKERS'])
+
         # 注册事件监听
         self.event_register()
 
@@ -33,6 +49,10 @@ class AccountEngine():
 
     def event_register(self):
         """注册事件监听"""
+        # 推送服务会在未开启持久化时产生事件，持久化处理只在开启持久化时注册
+        if not self.pst_active:
+            return
+
         self.event_engine.register(EVENT_ACCOUNT_UPDATE, self.process_account_update)
         self.event_engine.register(EVENT_ACCOUNT_AVL_UPDATE, self.process_account_avl_update)
         self.event_engine.register(EVENT_ACCOUNT_ASSETS_UPDATE, self.process_account_assets_update)
@@ -56,28 +76,57 @@ class AccountEngine():
 
         return self
 
-    def load_data(self):
+    def close(self):
+        """引擎关闭，账户数据都在主进程内存中，没有需要释放的资源"""
+        pass
+
+    def load_data(self, account_list: list = None):
         """
         加载数据
         用于在系统意外停止后，重启时加载数据使用
+        所有账户的数据通过少量的联合查询批量获取，再按账户分组构造交易员
+        :param account_list: 需要加载的账户列表，默认加载所有账户
         :return:
         """
-        account_list = query_account_list(self.db)
+        if account_list is None:
+            account_list = query_account_list(self.db)
         orders_book = dict()
-        for account_id in account_list:
-            orders = query_orders_today(account_id, self.db)
-            if isinstance(orders, list):
-                # 加载账户数据
-                self.load_trader_data(account_id)
-
-                # 加载订单数据
-                for order in orders:
-                    order = order_generate(order)
-                    if order.status in [Status.SUBMITTING.value,
-                                           Status.NOTTRADED.value,
-                                           Status.PARTTRADED.value]:
-                        # 未成交的订单添加到订单薄
-                        orders_book[order.order_id] = order
+
+        # 只有当日存在订单的账户需要加载
+        orders_dict = query_orders_today_bulk(account_list, self.db)
+        token_list = list(orders_dict.keys())
+        if not token_list:
+            return orders_book
+
+        account_dict = query_account_bulk(token_list, self.db)
+        pos_dict = query_position_bulk(token_list, self.db)
+        pos_record_dict = query_pos_records_not_clear_bulk(token_list, self.db)
+
+        for account_id in token_list:
+            account = account_dict.get(account_id)
+            if not account:
+                continue
+
+            # 加载账户数据
+            trader = Trader(self.event_engine,
+                            account,
+                            self.pst_active,
+                            LoadDataMode.TRADING,
+                            self.db,
+                            data={
+                                'pos': pos_dict.get(account_id, []),
+                                'orders': orders_dict.get(account_id, []),
+                                'pos_record': pos_record_dict.get(account_id, [])
+                            })
+            self.trader_dict[account_id] = trader
+
+            # 加载订单数据
+            for order in trader.orders.values():
+                if order.status in [Status.SUBMITTING.value,
+                                    Status.NOTTRADED.value,
+                                    Status.PARTTRADED.value]:
+                    # 未成交的订单添加到订单薄
+                    orders_book[order.order_id] = order
 
         return orders_book
 
@@ -97,15 +146,19 @@ class AccountEngine():
         """创建账户"""
         account_dict = on_account_add(info, self.db)
         if account_dict:
-            token = account_dict['account_id']
-            if not self.trader_dict.get(token):
-                account = Trader(self.event_engine,
-                                 account_dict,
-                                 self.pst_active,
-                                 LoadDataMode.CREAT,
-                                 self.db)
-                self.trader_dict[token] = account
-                return account_dict
+            return self.creat_trader(account_dict)
+
+    def creat_trader(self, account_dict: dict):
+        """使用新建的账户数据生成交易员"""
+        token = account_dict['account_id']
+        if not self.trader_dict.get(token):
+            account = Trader(self.event_engine,
+                             account_dict,
+                             self.pst_active,
+                             LoadDataMode.CREAT,
+                             self.db)
+            self.trader_dict[token] = account
+            return account_dict
 
     def login(self, token: str):
         """
@@ -132,68 +185,185 @@ class AccountEngine():
             else:
                 return False
         else:
-            account = copy.deepcopy(trader.account)
-            return account.__dict__
+            return trader.read_account()
 
     def logout(self, token: str):
         """账户登出"""
         if self.trader_dict.get(token, None):
             del self.trader_dict[token]
+        self.actor_dict.pop(token, None)
+
+    def tell(self, trader: Trader, method: str, *args):
+        """
+        调用交易员的修改方法
+        Actor模式下将消息放入交易员的邮箱，否则直接调用
+        :return: Future
+        """
+        if self.actor_pool:
+            actor = self.actor_dict.get(trader.token)
+            if not actor:
+                actor = self.actor_dict.setdefault(trader.token, TraderActor(trader, self.actor_pool))
+            return actor.tell(method, *args)
+
+        future = Future()
+        future.set_result(getattr(trader, method)(*args))
+        return future
+
+    def submit(self, token: str, method: str, *args):
+        """向账户发送消息，账户未登录时返回None"""
+        trader = self.trader_dict.get(token)
+        if trader:
+            return self.tell(trader, method, *args)
 
     def orders_arrived(self, order: Order):
         """订单到达处理"""
         trader = self.trader_dict.get(order.account_id)
         if trader:
-            status, msg = trader.on_orders_arrived(order)
+            status, msg = self.tell(trader, "on_orders_arrived", order).result()
             return status, msg
         else:
             return False, "交易账户未登陆"
 
-    def orders_deal(self, order: Order):
-        """订单成交处理"""
-        trader = self.trader_dict.get(order.account_id)
-        trader.on_order_deal(order)
+    def orders_arrived_batch(self, token: str, orders: list):
+        """批量订单到达处理"""
+        trader = self.trader_dict.get(token)
+        if trader:
+            return self.tell(trader, "on_orders_arrived_batch", orders).result()
+        else:
+            return [(False, "交易账户未登陆") for order in orders]
+
+    def orders_deal(self, order: Order, volume: float = None, price: float = None):
+        """订单成交处理，volume及price为本次成交的数量及价格"""
+        return self.submit(order.account_id, "on_order_deal", order, volume, price)
 
     def orders_cancel(self, order: Order):
-        """订单成交处理"""
-        trader = self.trader_dict.get(order.account_id)
-        trader.on_order_cancel(order)
+        """订单取消处理"""
+        return self.submit(order.account_id, "on_order_cancel", order)
 
     def orders_refused(self, order: Order):
-        """订单成交处理"""
-        trader = self.trader_dict.get(order.account_id)
-        trader.on_order_refuse(order)
+        """订单拒单处理"""
+        return self.submit(order.account_id, "on_order_refuse", order)
 
     def orders_status_update(self, order: Order):
-        """订单成交处理"""
-        trader = self.trader_dict.get(order.account_id)
-        trader.on_order_status_update(order)
-
-    def liquidation(self, hq_client):
-        """清算"""
-        today = datetime.now().strftime("%Y%m%d")
-
-        for token, trader in self.trader_dict.items():
-            for symbol, pos in trader.pos.items():
-                hq = hq_client.get_realtime_data(symbol)
-                if hq is not None:
-                    now_price = round(hq.loc[0, "price"], 5)
-                    # 更新收盘行情
-                    trader.on_position_update_price(pos, now_price)
-            # 清算
-            trader.on_liquidation(today)
+        """订单状态更新处理"""
+        return self.submit(order.account_id, "on_order_status_update", order)
+
+    def liquidation(self, hq_client, liq_date: str = None):
+        """
+        清算，所有账户持有的证券一次批量查询收盘价格
+        :param liq_date: 清算日期，默认为当天
+        :return: (清算成功的账户数量, 清算失败的账户数量)
+        """
+        today = liq_date or datetime.now().strftime("%Y%m%d")
+
+        price_dict = hq_client.get_close_prices(self.held_symbols())
+        return self.liq_all(today, price_dict)
+
+    def held_symbols(self):
+        """查询所有交易员持有的证券代码"""
+        symbols = set()
+        for trader in list(self.trader_dict.values()):
+            symbols.update(trader.pos.keys())
+
+        return symbols
+
+    def liq_all(self, liq_date: str, price_dict: dict):
+        """
+        使用给定的收盘价格清算所有账户
+        :return: (清算成功的账户数量, 清算失败的账户数量)
+        """
+        success, failed = self.liq_batch([(liq_date, price_dict)])
+        return success, len(failed)
+
+    def liq_batch(self, liq_list: list, tokens: list = None):
+        """
+        批量清算
+        各账户在线程池中并行清算并批量持久化，单个账户失败不影响其他账户
+        :param liq_list: [(清算日期, 收盘价格字典)]，每个账户按顺序依次清算
+        :param tokens: 需要清算的账户列表，默认清算所有已登录的账户
+        :return: (清算成功的账户数量, 清算失败的账户列表)
+        """
+        failed = list()
+        if tokens is None:
+            traders = list(self.trader_dict.values())
+        else:
+            traders = list()
+            for token in tokens:
+                trader = self.trader_dict.get(token)
+                if trader:
+                    traders.append(trader)
+                else:
+                    failed.append(token)
+        if not traders:
+            return 0, failed
+
+        workers = min(SETTINGS['LIQ_WORKERS'], len(traders))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda trader: self.liq_one(trader, liq_list), traders))
+
+        failed.extend(trader.token for trader, result in zip(traders, results) if not result)
+        return sum(results), failed
+
+    def liq_one(self, trader: Trader, liq_list: list):
+        """
+        依次清算单个账户，清算结果合并后一次持久化
+        某一日清算失败时，之前已在内存中完成清算的日期仍然持久化，保证内存与数据库一致
+        """
+        merged = None
+        liq_date = None
+        try:
+            for liq_date, price_dict in liq_list:
+                result = self.tell(trader, "on_liquidation", liq_date, price_dict, True).result()
+                if not isinstance(result, dict):
+                    continue
+                if merged is None:
+                    merged = result
+                else:
+                    merged['account'] = result['account']
+                    merged['pos'] = result['pos']
+                    merged['cleared'].extend(result['cleared'])
+                    merged['records'].extend(result['records'])
+        except Exception:
+            self.write_log(f"账户清算失败：{trader.token}，清算日期：{liq_date}\n{traceback.format_exc()}",
+                           logging.ERROR)
+            self.liq_persist(trader, merged)
+            return False
+
+        return self.liq_persist(trader, merged)
+
+    def liq_persist(self, trader: Trader, merged: dict):
+        """持久化合并后的清算结果"""
+        if not merged:
+            return True
+
+        try:
+            on_liquidation_bulk(trader.token, merged, self.db)
+            return True
+        except Exception:
+            self.write_log(f"账户清算结果保存失败：{trader.token}\n{traceback.format_exc()}", logging.ERROR)
+            return False
 
     def liq_manual(self, token, liq_date, price_dict):
         """手工清算"""
         trader = self.trader_dict.get(token)
 
         if trader:
-            if trader.on_liquidation(liq_date, price_dict):
+            if self.tell(trader, "on_liquidation", liq_date, price_dict).result():
                 return True
         # 账户未登陆
         else:
             return False
 
+    def query_version(self, token: str):
+        """
+        查询账户数据版本
+        账户数据的任何修改都会改变版本，用于缓存查询结果
+        :return: (交易员实例编号, 数据版本号)，账户未登录时返回None
+        """
+        trader = self.trader_dict.get(token, None)
+        if trader:
+            return trader.generation, trader.version
+
     def query_account_data(self, token: str):
         """
         查询账户信息
@@ -203,8 +373,7 @@ class AccountEngine():
         """
         trader = self.trader_dict.get(token, None)
         if trader:
-            account = trader.account
-            return True, account.__dict__
+            return True, trader.read_account()
         else:
             return False, "账户未登录"
 
@@ -217,12 +386,7 @@ class AccountEngine():
         """
         trader = self.trader_dict.get(token, None)
         if trader:
-            pos = copy.copy(trader.pos)
-            if pos:
-                pos_data = [d.__dict__ for d in pos.values()]
-                return True, pos_data
-            else:
-                return True, []
+            return True, trader.read_pos()
         else:
             return False, "账户未登录"
 
@@ -230,9 +394,7 @@ class AccountEngine():
         """查询当天交易订单"""
         trader = self.trader_dict.get(token, None)
         if trader:
-            orders = list()
-            for d in trader.orders.values():
-                orders.append(d.__dict__)
+            orders = list(trader.read_orders())
 
             if orders:
                 return True, orders
@@ -246,9 +408,7 @@ class AccountEngine():
         # 检查账户登录情况
         trader = self.trader_dict.get(token, None)
         if trader:
-            orders = list()
-            for d in trader.orders.values():
-                orders.append(d.__dict__)
+            orders = list(trader.read_orders())
 
             if orders:
                 return True, orders
@@ -257,12 +417,133 @@ class AccountEngine():
         else:
             return False, "账户未登录"
 
+    def orders_index(self, token: str):
+        """为账户订单表创建索引，每个账户只创建一次"""
+        if token not in self.indexed_tokens:
+            on_orders_index(token, self.db)
+            self.indexed_tokens.add(token)
+
+    def query_order_status(self, token: str, order_id: str):
+        """
+        查询订单状态
+        账户已登录时从内存中查询，内存中没有完整订单数据时再从数据库查询
+        """
+        trader = self.trader_dict.get(token, None)
+        if trader:
+            status = trader.read_order_status(order_id)
+            if status:
+                return True, status
+            elif trader.covers():
+                return False, "无此订单"
+
+        self.orders_index(token)
+        return query_order_status(token, order_id, self.db)
+
+    def query_orders_by_date(self, token: str, start: str = None, end: str = None):
+        """
+        按日期范围查询订单
+        账户已登录且内存中包含该日期范围的全部订单时从内存查询；
+        内存中的订单不完整时，内存订单起始日期之前的订单从数据库查询，之后的以内存为准
+        """
+        trader = self.trader_dict.get(token, None)
+        if trader and trader.covers(start):
+            return True, trader.read_orders_by_date(start, end)
+
+        self.orders_index(token)
+        if not trader:
+            return True, query_orders(token, self.db, order_date_filter(start, end)) or []
+
+        flt = order_date_filter(start, end, trader.orders_since)
+        orders = query_orders(token, self.db, flt) or []
+        return True, orders + trader.read_orders_by_date(start, end)
+
+    def query_orders_page(self, token: str, start: str = None, end: str = None,
+                          cursor: str = None, limit: int = None, fields: list = None):
+        """
+        分页查询订单，按订单ID排序，以订单ID作为翻页游标
+        :return: (状态, 订单列表, 下一页游标)，没有下一页时游标为None
+        """
+        limit = min(limit or SETTINGS['PAGE_SIZE'], SETTINGS['MAX_PAGE_SIZE'])
+
+        # 翻页游标为订单ID，查询字段中没有订单ID时需要额外查询，返回前再去除
+        strip_id = bool(fields) and 'order_id' not in fields
+        if strip_id:
+            fields = list(fields) + ['order_id']
+        orders = list(self.export_orders(token, start, end, cursor, limit + 1, fields))
+
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = orders[-1]['order_id']
+
+        if strip_id:
+            orders = [{k: v for k, v in o.items() if k != 'order_id'} for o in orders]
+
+        return True, orders, next_cursor
+
+    def export_orders(self, token: str, start: str = None, end: str = None,
+                      cursor: str = None, limit: int = None, fields: list = None):
+        """
+        按订单ID顺序逐条读取订单
+        内存中包含全部订单时读取内存快照，否则直接迭代数据库游标，不缓存查询结果；
+        内存中的订单不完整时，内存订单起始日期之前的订单从数据库游标读取，再与内存订单按订单ID归并
+        """
+        trader = self.trader_dict.get(token, None)
+        if trader:
+            orders = trader.read_orders_by_date(start, end)
+            if cursor:
+                orders = [o for o in orders if o['order_id'] > cursor]
+            orders = sorted(orders, key=lambda o: o['order_id'])
+            if limit:
+                orders = orders[:limit]
+
+            if trader.covers(start):
+                for o in orders:
+                    yield {k: o.get(k) for k in fields} if fields else o
+                return
+
+        self.orders_index(token)
+        if not trader:
+            yield from query_orders_cursor(token, self.db, order_date_filter(start, end), cursor, limit, fields)
+            return
+
+        # 归并需要订单ID，查询字段中没有订单ID时额外查询，返回前再去除
+        query_fields = list(fields) + ['order_id'] if fields and 'order_id' not in fields else fields
+        flt = order_date_filter(start, end, trader.orders_since)
+        stored = query_orders_cursor(token, self.db, flt, cursor, limit, query_fields)
+        for o in islice(heapq.merge(stored, orders, key=lambda o: o['order_id']), limit):
+            yield {k: o.get(k) for k in fields} if fields else o
+
+    def query_open_orders(self, token: str, order_ids: list = None, symbol: str = None):
+        """
+        查询未完成的订单
+        :param token: 账户ID
+        :param order_ids: 订单ID列表，为空时查询所有未完成订单
+        :param symbol: 证券代码，为空时不限制
+        :return: 订单数据列表
+        """
+        trader = self.trader_dict.get(token, None)
+        if trader:
+            open_status = [Status.SUBMITTING.value,
+                           Status.NOTTRADED.value,
+                           Status.PARTTRADED.value]
+            id_set = set(order_ids) if order_ids is not None else None
+            orders = [
+                o for o in trader.read_orders()
+                if o['status'] in open_status
+                and (id_set is None or o['order_id'] in id_set)
+                and (not symbol or o['pt_symbol'] == symbol)
+            ]
+            return True, orders
+        else:
+            return False, "账户未登录"
+
     def query_account_record(self, token: str, start=None, end=None):
         """查询账户记录"""
         trader = self.trader_dict.get(token, None)
         if trader:
             records = list()
-            df = trader.account_record
+            df = trader.read_account_record()
             if len(df):
                 if start and end:
                     df = df.loc[(df['check_date'] >= start) & (df['check_date'] <= end)]
@@ -286,7 +567,7 @@ class AccountEngine():
         trader = self.trader_dict.get(token, None)
         if trader:
             records = list()
-            df = trader.pos_record
+            df = trader.read_pos_record()
             if len(df):
                 if start and end:
                     df = df.loc[(df['first_buy_date'] >= start) & (df['last_sell_date'] <= end)]
@@ -305,41 +586,107 @@ class AccountEngine():
         else:
             return False, "账户未登录"
 
+    def query_report(self, token: str, start: str = None, end: str = None):
+        """
+        查询交易结果报表
+        不指定日期范围时使用交易员的报表累加器，首次查询时由历史数据初始化，之后随清算和成交更新；
+        指定日期范围时由范围内的历史数据计算
+        """
+        trader = self.trader_dict.get(token, None)
+        if not trader:
+            return False, "账户未登录"
+
+        account = trader.account
+        if start or end:
+            records = self.report_records(trader, start, end)
+            return True, build_report(account.capital, account.cost, account.tax, *records)
+
+        if trader.report is None:
+            # 数据库中的历史记录在锁外查询，持锁期间只合并内存记录并初始化累加器，不阻塞成交等修改
+            history = self.report_history(trader)
+            with trader.lock:
+                if trader.report is None:
+                    records = self.merge_report_records(trader, history)
+                    trader.report = ReportAccumulator.from_records(account.capital, account.cost, account.tax,
+                                                                   *records)
+
+        with trader.lock:
+            return True, trader.report.statistics()
+
+    def report_records(self, trader, start: str = None, end: str = None):
+        """获取计算报表需要的账户记录、持仓记录和成交订单"""
+        return self.merge_report_records(trader, self.report_history(trader), start, end)
+
+    def report_history(self, trader):
+        """
+        内存中的数据不完整时，从数据库查询计算报表需要的历史数据
+        :return: (账户记录, 持仓记录, 内存订单起始日期之前的成交订单)
+        """
+        token = trader.token
+        if trader.orders_since is None:
+            return [], [], []
+
+        account_records = query_account_record(token, self.db) or []
+        pos_records = query_pos_records(token, self.db) or []
+        flt = {'order_date': {'$lt': trader.orders_since}, 'traded': {'$gt': 0}}
+        orders = query_orders(token, self.db, flt) or []
+        return account_records, pos_records, orders
+
+    def merge_report_records(self, trader, history: tuple, start: str = None, end: str = None):
+        """合并内存记录与数据库中的历史记录，两者都有的记录以内存为准"""
+        stored_accounts, stored_pos, stored_orders = history
+        account_df = trader.read_account_record()
+        pos_df = trader.read_pos_record()
+        account_records = account_df.to_dict(orient='records') if len(account_df) else []
+        pos_records = pos_df.to_dict(orient='records') if len(pos_df) else []
+        orders = [o for o in trader.read_orders() if o['traded'] > 0]
+
+        dates = {r['check_date'] for r in account_records}
+        account_records = [r for r in stored_accounts if r['check_date'] not in dates] + account_records
+
+        keys = {(r['pt_symbol'], r['first_buy_date']) for r in pos_records}
+        pos_records = [r for r in stored_pos if (r['pt_symbol'], r['first_buy_date']) not in keys] + pos_records
+
+        orders = stored_orders + orders
+
+        return filter_records(account_records, pos_records, orders, start, end)
+
     def data_persistance(self, token: str):
         """持久化数据"""
         trader = self.trader_dict.get(token)
         if trader:
-            # 持久化账户数据
-            account = trader.account
-            on_account_update({
-                'token': account.account_id,
-                'avl': account.available,
-                'market_value': account.market_value,
-                'assets': account.assets
-            }, self.db)
-
-            # 持久化持仓数据
-            on_position_clear(token, self.db)
-            for symbol, pos in trader.pos.items():
-                pos_copy = copy.copy(pos)
-                on_position_insert(pos_copy, self.db)
-
-
-            # 持久化订单数据
-            on_orders_clear(token, self.db)
-            orders_copy = copy.deepcopy(trader.orders)
-            orders = [order.__dict__ for order in orders_copy.values()]
-            on_orders_insert_many(token, orders, self.db)
-
-            # 持久化账户记录数据
-            account_record_clear(token, self.db)
-            account_record_list = trader.account_record.to_dict(orient='records')
-            account_record_insert_many(token, account_record_list, self.db)
-
-            # 持久化持仓记录数据
-            pos_record_clear(token, self.db)
-            pos_record_list = trader.pos_record.to_dict(orient='records')
-            pos_record_insert_many(token, pos_record_list, self.db)
+            # 持有账户锁，保证持久化的数据一致
+            with trader.lock:
+                # 持久化账户数据
+                account = trader.account
+                on_account_update({
+                    'token': account.account_id,
+                    'avl': account.available,
+                    'market_value': account.market_value,
+                    'assets': account.assets
+                }, self.db)
+
+                # 持久化持仓数据
+                on_position_clear(token, self.db)
+                for symbol, pos in trader.pos.items():
+                    pos_copy = copy.copy(pos)
+                    on_position_insert(pos_copy, self.db)
+
+                # 持久化订单数据
+                on_orders_clear(token, self.db)
+                orders_copy = copy.deepcopy(trader.orders)
+                orders = [order.__dict__ for order in orders_copy.values()]
+                on_orders_insert_many(token, orders, self.db)
+
+                # 持久化账户记录数据
+                account_record_clear(token, self.db)
+                account_record_list = trader.account_record.to_dict(orient='records')
+                account_record_insert_many(token, account_record_list, self.db)
+
+                # 持久化持仓记录数据
+                pos_record_clear(token, self.db)
+                pos_record_list = trader.pos_record.to_dict(orient='records')
+                pos_record_insert_many(token, pos_record_list, self.db)
 
             return True
         else:
@@ -0,0 +1,402 @@
+
+import zlib
+import logging
+import traceback
+from datetime import datetime
+from itertools import count
+from concurrent.futures import Future
+from threading import Thread, Lock
+from multiprocessing import get_context
+
+from paper_trading.event import Event, EventEngine
+from paper_trading.api.db import MongoDBService
+from paper_trading.utility.model import LogData
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.utility.event import EVENT_LOG, EVENT_ERROR, PUSH_EVENTS
+from paper_trading.trade.db_model import on_account_add, query_account_list
+
+
+def shard_hash(token: str, shard_num: int):
+    """计算账户所属的分片，使用crc32保证不同进程中结果一致"""
+    return zlib.crc32(token.encode("utf-8")) % shard_num
+
+
+def run_shard(conn, index: int, pst_active, load_data_mode, settings: dict):
+    """
+    分片工作进程
+    进程内拥有独立的事件引擎、数据库连接和账户引擎，
+    循环接收主进程发来的(请求ID, 方法名, 参数)并执行，
+    请求ID为None的消息不需要回复
+    """
+    from paper_trading.trade.account import set_order_id_node
+    from paper_trading.trade.account_engine import AccountEngine
+
+    SETTINGS.update(settings)
+    set_order_id_node(index + 1)
+    send_lock = Lock()
+
+    def send(msg):
+        with send_lock:
+            conn.send(msg)
+
+    def forward(event):
+        """将日志、错误及推送事件转发到主进程"""
+        send((None, True, event))
+
+    event_engine = EventEngine()
+    event_engine.register(EVENT_LOG, forward)
+    event_engine.register(EVENT_ERROR, forward)
+    if SETTINGS['PUSH_ACTIVE']:
+        for event_name in PUSH_EVENTS:
+            event_engine.register(event_name, forward)
+    event_engine.start()
+
+    db = MongoDBService(SETTINGS['MONGO_HOST'], SETTINGS['MONGO_PORT'])
+    db.connect_db()
+
+    engine = AccountEngine(event_engine, pst_active, load_data_mode, db)
+    engine.start()
+    engine.write_log(f"账户分片{index}：启动")
+
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+
+        if msg is None:
+            break
+
+        req_id, method, args = msg
+        try:
+            result = getattr(engine, method)(*args)
+            if req_id is not None:
+                send((req_id, True, result))
+        except Exception:
+            error = traceback.format_exc()
+            if req_id is not None:
+                send((req_id, False, error))
+            else:
+                event_engine.put(Event(EVENT_ERROR, error))
+
+    engine.close()
+    event_engine.stop()
+    db.close()
+    conn.close()
+
+
+class AccountShard:
+    """账户分片，负责与一个工作进程通信"""
+
+    def __init__(self, index: int, event_engine, pst_active, load_data_mode, settings: dict):
+        ctx = get_context("spawn")
+        self.index = index
+        self.event_engine = event_engine                # 主进程事件引擎
+
+        self._conn, self._child_conn = ctx.Pipe()
+        self._process = ctx.Process(
+            target=run_shard,
+            args=(self._child_conn, index, pst_active, load_data_mode, settings),
+            daemon=True
+        )
+        self._send_lock = Lock()
+        self._req_ids = count(1)
+        self._futures = dict()                          # 等待回复的请求
+        self._closed = False                            # 工作进程是否已退出
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """启动工作进程及回复接收线程"""
+        self._process.start()
+        # 主进程关闭子端连接的副本，工作进程退出后接收线程才能收到EOF
+        self._child_conn.close()
+        self._thread.start()
+
+    def close(self):
+        """关闭工作进程及回复接收线程"""
+        with self._send_lock:
+            if not self._closed:
+                try:
+                    self._conn.send(None)
+                except OSError:
+                    pass
+        self._process.join()
+        self._thread.join()
+        self._conn.close()
+
+    def submit(self, method: str, *args):
+        """发送请求，返回Future"""
+        future = Future()
+        with self._send_lock:
+            if self._closed:
+                future.set_exception(RuntimeError(f"账户分片{self.index}已关闭"))
+                return future
+
+            req_id = next(self._req_ids)
+            self._futures[req_id] = future
+            self._conn.send((req_id, method, args))
+
+        return future
+
+    def call(self, method: str, *args):
+        """发送请求并等待结果"""
+        return self.submit(method, *args).result()
+
+    def post(self, method: str, *args):
+        """发送请求，不等待回复"""
+        with self._send_lock:
+            self._conn.send((None, method, args))
+
+    def _run(self):
+        """接收工作进程的回复及转发的事件"""
+        while True:
+            try:
+                req_id, ok, data = self._conn.recv()
+            except (EOFError, OSError):
+                break
+
+            if req_id is None:
+                self.event_engine.put(data)
+                continue
+
+            future = self._futures.pop(req_id, None)
+            if future:
+                if ok:
+                    future.set_result(data)
+                else:
+                    future.set_exception(RuntimeError(data))
+
+        # 工作进程退出，未完成的请求全部失败
+        with self._send_lock:
+            self._closed = True
+            futures = list(self._futures.values())
+            self._futures.clear()
+
+        for future in futures:
+            future.set_exception(RuntimeError(f"账户分片{self.index}已关闭"))
+
+
+class ShardedAccountEngine():
+    """
+    分片账户引擎
+    账户按token哈希分配到多个工作进程，每个进程持有自己的交易员，
+    对外提供与AccountEngine一致的接口，不同分片的账户可以真正并行处理
+    """
+    def __init__(
+            self,
+            event_engine,
+            pst_active,
+            load_data_mode,
+            db,
+            shard_num: int,
+    ):
+        if shard_num > 99:
+            raise ValueError("账户分片数量不能超过99")
+
+        self.event_engine = event_engine        # 事件引擎
+        self.db = db                            # 数据库实例
+        self.pst_active = pst_active            # 数据持久化开关
+        self.load_data_mode = load_data_mode    # 加载数据的模式
+        self.shard_num = shard_num              # 分片数量
+
+        settings = dict(SETTINGS)
+        self.shards = [
+            AccountShard(i, event_engine, pst_active, load_data_mode, settings)
+            for i in range(shard_num)
+        ]
+
+        self.write_log(f"分片账户引擎：初始化完毕，分片数量{shard_num}")
+
+    def start(self):
+        """引擎初始化"""
+        for shard in self.shards:
+            shard.start()
+
+        self.write_log("分片账户引擎：启动")
+
+        return self
+
+    def close(self):
+        """关闭所有分片"""
+        for shard in self.shards:
+            shard.close()
+
+    def get_shard(self, token: str):
+        """获取账户所在的分片"""
+        return self.shards[shard_hash(token, self.shard_num)]
+
+    def call_all(self, method: str, *args):
+        """在所有分片上并行执行并返回结果列表"""
+        futures = [shard.submit(method, *args) for shard in self.shards]
+        return [future.result() for future in futures]
+
+    def load_data(self):
+        """按分片并行加载数据"""
+        account_list = query_account_list(self.db)
+        groups = [[] for _ in range(self.shard_num)]
+        for token in account_list:
+            groups[shard_hash(token, self.shard_num)].append(token)
+
+        futures = [shard.submit("load_data", groups[i]) for i, shard in enumerate(self.shards)]
+        orders_book = dict()
+        for future in futures:
+            orders_book.update(future.result())
+
+        return orders_book
+
+    def creat(self, info: dict):
+        """创建账户"""
+        account_dict = on_account_add(info, self.db)
+        if account_dict:
+            token = account_dict['account_id']
+            return self.get_shard(token).call("creat_trader", account_dict)
+
+    def login(self, token: str):
+        """账户登录"""
+        return self.get_shard(token).call("login", token)
+
+    def logout(self, token: str):
+        """账户登出"""
+        return self.get_shard(token).call("logout", token)
+
+    def orders_arrived(self, order):
+        """订单到达处理"""
+        return self.get_shard(order.account_id).call("orders_arrived", order)
+
+    def orders_arrived_batch(self, token: str, orders: list):
+        """批量订单到达处理"""
+        return self.get_shard(token).call("orders_arrived_batch", token, orders)
+
+    def orders_deal(self, order, volume: float = None, price: float = None):
+        """订单成交处理"""
+        self.get_shard(order.account_id).post("orders_deal", order, volume, price)
+
+    def orders_cancel(self, order):
+        """订单取消处理"""
+        self.get_shard(order.account_id).post("orders_cancel", order)
+
+    def orders_refused(self, order):
+        """订单拒单处理"""
+        self.get_shard(order.account_id).post("orders_refused", order)
+
+    def orders_status_update(self, order):
+        """订单状态更新处理"""
+        self.get_shard(order.account_id).post("orders_status_update", order)
+
+    def held_symbols(self):
+        """查询所有交易员持有的证券代码"""
+        symbols = set()
+        for result in self.call_all("held_symbols"):
+            symbols.update(result)
+
+        return symbols
+
+    def liquidation(self, hq_client, liq_date: str = None):
+        """
+        清算，收盘价格在主进程中查询后分发到各分片
+        :param liq_date: 清算日期，默认为当天
+        :return: (清算成功的账户数量, 清算失败的账户数量)
+        """
+        today = liq_date or datetime.now().strftime("%Y%m%d")
+
+        price_dict = hq_client.get_close_prices(self.held_symbols())
+        results = self.call_all("liq_all", today, price_dict)
+        return sum(r[0] for r in results), sum(r[1] for r in results)
+
+    def liq_batch(self, liq_list: list, tokens: list = None):
+        """批量清算，账户按分片分组后在各分片上并行清算"""
+        if tokens is None:
+            results = self.call_all("liq_batch", liq_list, None)
+        else:
+            groups = [[] for _ in range(self.shard_num)]
+            for token in tokens:
+                groups[shard_hash(token, self.shard_num)].append(token)
+            futures = [shard.submit("liq_batch", liq_list, groups[i])
+                       for i, shard in enumerate(self.shards) if groups[i]]
+            results = [future.result() for future in futures]
+
+        failed = list()
+        for r in results:
+            failed.extend(r[1])
+        return sum(r[0] for r in results), failed
+
+    def liq_manual(self, token, liq_date, price_dict):
+        """手工清算"""
+        return self.get_shard(token).call("liq_manual", token, liq_date, price_dict)
+
+    def query_version(self, token: str):
+        """查询账户数据版本"""
+        return self.get_shard(token).call("query_version", token)
+
+    def query_account_data(self, token: str):
+        """查询账户信息"""
+        return self.get_shard(token).call("query_account_data", token)
+
+    def query_pos_data(self, token: str):
+        """查询持仓信息"""
+        return self.get_shard(token).call("query_pos_data", token)
+
+    def query_orders_today(self, token: str):
+        """查询当天交易订单"""
+        return self.get_shard(token).call("query_orders_today", token)
+
+    def query_orders(self, token: str):
+        """查询所有订单"""
+        return self.get_shard(token).call("query_orders", token)
+
+    def query_order_status(self, token: str, order_id: str):
+        """查询订单状态"""
+        return self.get_shard(token).call("query_order_status", token, order_id)
+
+    def query_orders_by_date(self, token: str, start: str = None, end: str = None):
+        """按日期范围查询订单"""
+        return self.get_shard(token).call("query_orders_by_date", token, start, end)
+
+    def query_orders_page(self, token: str, start: str = None, end: str = None,
+                          cursor: str = None, limit: int = None, fields: list = None):
+        """分页查询订单"""
+        return self.get_shard(token).call("query_orders_page", token, start, end, cursor, limit, fields)
+
+    def export_orders(self, token: str, start: str = None, end: str = None,
+                      cursor: str = None, limit: int = None, fields: list = None):
+        """按订单ID顺序逐条读取订单，分页从分片中获取，每次只缓存一页数据"""
+        count = 0
+        while True:
+            size = SETTINGS['EXPORT_BATCH_SIZE']
+            if limit:
+                size = min(size, limit - count)
+            status, orders, cursor = self.query_orders_page(token, start, end, cursor, size, fields)
+            yield from orders
+
+            count += len(orders)
+            if not cursor or (limit and count >= limit):
+                break
+
+    def query_open_orders(self, token: str, order_ids: list = None, symbol: str = None):
+        """查询未完成的订单"""
+        return self.get_shard(token).call("query_open_orders", token, order_ids, symbol)
+
+    def query_account_record(self, token: str, start=None, end=None):
+        """查询账户记录"""
+        return self.get_shard(token).call("query_account_record", token, start, end)
+
+    def query_pos_record(self, token: str, start=None, end=None):
+        """查询持仓记录"""
+        return self.get_shard(token).call("query_pos_record", token, start, end)
+
+    def query_report(self, token: str, start: str = None, end: str = None):
+        """查询交易结果报表"""
+        return self.get_shard(token).call("query_report", token, start, end)
+
+    def data_persistance(self, token: str):
+        """持久化数据"""
+        return self.get_shard(token).call("data_persistance", token)
+
+    def write_log(self, msg: str, level: int = logging.INFO):
+        """"""
+        log = LogData(
+            log_content=msg,
+            log_level=level
+        )
+        event = Event(EVENT_LOG, log)
+        self.event_engine.put(event)
@@ -26,6 +26,19 @@ def get_stock_daily_qfq(symbol: str, start: str, end: str, db):
     else:
         return False
 
+def get_trade_days(db):
+    """查询所有交易日"""
+    raw_data = {}
+    raw_data["flt"] = {'is_open': 1}
+    raw_data["projection"] = ['cal_date']
+
+    db_data = DBData(
+        db_name="stocks",
+        db_cl="trade_cal",
+        raw_data=raw_data
+    )
+    return [d['cal_date'] for d in db.on_select(db_data)]
+
 def get_stock_daily(symbol: str, start: str, end: str, ser):
     """获取日线数据"""
     pass
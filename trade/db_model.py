@@ -1,6 +1,7 @@
 
 import copy
 from datetime import datetime
+from collections import defaultdict
 
 from paper_trading.utility.setting import get_token, SETTINGS
 from paper_trading.utility.model import (
@@ -272,6 +273,36 @@ def on_order_status_update(data, db):
     return db.on_update(db_data)
 
 
+def on_orders_index(token: str, db):
+    """为订单表创建订单ID及订单日期索引"""
+    raw_data = {}
+    raw_data['index'] = [
+        [('order_id', 1)],
+        [('order_date', 1), ('order_id', 1)]
+    ]
+    db_data = DBData(
+        db_name=SETTINGS['TRADE_DB'],
+        db_cl=token,
+        raw_data=raw_data
+    )
+    return db.on_create_index(db_data)
+
+
+def order_date_filter(start: str = None, end: str = None, before: str = None):
+    """
+    订单日期范围查询条件
+    :param before: 只查询该日期之前的订单，为空时不限制
+    """
+    cond = dict()
+    if start:
+        cond['$gte'] = start
+    if end:
+        cond['$lte'] = end
+    if before:
+        cond['$lt'] = before
+    return {'order_date': cond} if cond else {}
+
+
 def query_orders(token: str, db, flt: dict = None):
     """查询交割单"""
     raw_data = {}
@@ -297,6 +328,34 @@ def query_orders(token: str, db, flt: dict = None):
             return False
 
 
+def query_orders_cursor(token: str, db, flt: dict = None, cursor: str = None,
+                        limit: int = None, fields: list = None):
+    """
+    按订单ID排序逐条读取订单，数据从数据库游标中分批获取
+    :param cursor: 上一页最后一个订单ID，只返回订单ID大于cursor的订单
+    :param limit: 返回的最大数量
+    :param fields: 返回的字段列表，为空时返回全部字段
+    """
+    flt = dict(flt or {})
+    if cursor:
+        flt['order_id'] = {'$gt': cursor}
+
+    raw_data = {}
+    raw_data["flt"] = flt
+    raw_data["projection"] = fields
+    raw_data["sort"] = [('order_id', 1)]
+    raw_data["limit"] = limit
+    raw_data["batch_size"] = SETTINGS['EXPORT_BATCH_SIZE']
+    db_data = DBData(
+        db_name=SETTINGS['TRADE_DB'],
+        db_cl=token,
+        raw_data=raw_data
+    )
+    for o in db.on_select(db_data):
+        o.pop("_id", None)
+        yield o
+
+
 def query_order_one(token: str, order_id: str, db):
     """查询一条订单数据"""
     raw_data = {}
@@ -545,16 +604,65 @@ def account_record_clear(token, db):
     )
     db.on_collection_delete(db_data)
 
+def on_liquidation_bulk(token: str, data: dict, db):
+    """
+    批量持久化清算结果
+    :param data: Trader.on_liquidation(bulk=True)返回的数据
+    """
+    # 账户资金
+    on_account_update(data['account'], db)
+
+    # 持仓价格及可用数量，清空的持仓删除
+    raw_data = {}
+    raw_data['update'] = [
+        ({'pt_symbol': pos.pt_symbol},
+         {'$set': {'now_price': pos.now_price, 'profit': pos.profit, 'available': pos.available}})
+        for pos in data['pos']
+    ]
+    if data['cleared']:
+        raw_data['delete'] = [{'pt_symbol': {'$in': data['cleared']}}]
+    db_data = DBData(
+        db_name=SETTINGS['POSITION_DB'],
+        db_cl=token,
+        raw_data=raw_data
+    )
+    db.on_bulk_write(db_data)
+
+    # 持仓记录清仓
+    if data['cleared']:
+        raw_data = {}
+        raw_data['update_many'] = [
+            ({'pt_symbol': {'$in': data['cleared']}, 'is_clear': 0}, {'$set': {'is_clear': 1}})
+        ]
+        db_data = DBData(
+            db_name=SETTINGS['POS_RECORD'],
+            db_cl=token,
+            raw_data=raw_data
+        )
+        db.on_bulk_write(db_data)
+
+    # 账户记录
+    raw_data = {}
+    raw_data['replace'] = [({'check_date': record.check_date}, record) for record in data['records']]
+    db_data = DBData(
+        db_name=SETTINGS['ACCOUNT_RECORD'],
+        db_cl=token,
+        raw_data=raw_data
+    )
+    db.on_bulk_write(db_data)
+
+    return True
+
 def query_account_record(token, db, start: str = None, end: str = None):
     """查询账户记录"""
     raw_data = {}
     raw_data['flt'] = {}
     if start and end == None:
-        raw_data["flt"] = {'first_buy_date': {'$gte': start}}
+        raw_data["flt"] = {'check_date': {'$gte': start}}
     elif start == None and end:
-        raw_data["flt"] = {'first_buy_date': {'$lte': end}}
+        raw_data["flt"] = {'check_date': {'$lte': end}}
     elif start and end:
-        raw_data["flt"] = {'first_buy_date': {'$gte': start, '$lte': end}}
+        raw_data["flt"] = {'check_date': {'$gte': start, '$lte': end}}
     db_data = DBData(
         db_name=SETTINGS['ACCOUNT_RECORD'],
         db_cl=token,
@@ -709,3 +817,57 @@ def query_pos_records_not_clear(token ,db):
         return pos_record
     else:
         return False
+
+
+"""批量加载"""
+
+
+def query_bulk(db_name: str, token_list: list, flt: dict, db):
+    """
+    跨账户批量查询
+    账户数据按账户分表保存，这里将多个账户的集合联合成一个游标进行查询，
+    结果按account_id分组返回
+    :param db_name: 数据库名称
+    :param token_list: 账户ID列表
+    :param flt: 查询条件
+    :param db: 数据库对象
+    :return: {account_id: [数据, ...]}
+    """
+    size = SETTINGS['BULK_LOAD_SIZE']
+    data = defaultdict(list)
+
+    for i in range(0, len(token_list), size):
+        raw_data = {}
+        raw_data['cls'] = token_list[i:i + size]
+        raw_data['flt'] = flt
+        db_data = DBData(
+            db_name=db_name,
+            db_cl="",
+            raw_data=raw_data
+        )
+        for d in db.on_union_select(db_data):
+            data[d['account_id']].append(d)
+
+    return data
+
+
+def query_account_bulk(token_list: list, db):
+    """批量查询账户信息"""
+    data = query_bulk(SETTINGS['ACCOUNT_DB'], token_list, {}, db)
+    return {token: accounts[0] for token, accounts in data.items()}
+
+
+def query_position_bulk(token_list: list, db):
+    """批量查询持仓信息"""
+    return query_bulk(SETTINGS['POSITION_DB'], token_list, {}, db)
+
+
+def query_orders_today_bulk(token_list: list, db):
+    """批量查询今天的所有订单"""
+    today = datetime.now().strftime("%Y%m%d")
+    return query_bulk(SETTINGS['TRADE_DB'], token_list, {"order_date": today}, db)
+
+
+def query_pos_records_not_clear_bulk(token_list: list, db):
+    """批量查询未清仓的持仓记录"""
+    return query_bulk(SETTINGS['POS_RECORD'], token_list, {'is_clear': 0}, db)
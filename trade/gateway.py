@@ -0,0 +1,316 @@
+
+import os
+import json
+import struct
+import socket
+import logging
+import traceback
+import socketserver
+from threading import Thread, Lock
+
+from paper_trading.event import Event
+from paper_trading.utility.model import LogData
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.utility.event import EVENT_LOG, EVENT_ERROR
+from paper_trading.utility.serializer import default
+from paper_trading.trade.account import new_order_generate, cancel_order_generate
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# 帧头，4字节大端无符号整数表示消息体长度
+HEADER = struct.Struct(">I")
+
+# 编码方式，连接建立后客户端发送1字节选择编码方式，服务端回复实际使用的编码方式
+CODEC_MSGPACK = b"M"
+CODEC_JSON = b"J"
+
+
+class Codec:
+    """消息编解码"""
+
+    def __init__(self, name: bytes):
+        self.name = name
+        if name == CODEC_MSGPACK:
+            self.encode = lambda obj: msgpack.packb(obj, default=default, use_bin_type=True)
+            self.decode = lambda data: msgpack.unpackb(data, raw=False)
+        else:
+            self.encode = lambda obj: json.dumps(obj, ensure_ascii=False, default=default).encode("utf-8")
+            self.decode = json.loads
+
+    def pack(self, msg: dict):
+        """编码并加上帧头"""
+        body = self.encode(msg)
+        return HEADER.pack(len(body)) + body
+
+
+class GatewayHandler(socketserver.BaseRequestHandler):
+    """
+    订单网关连接处理
+    一次读取缓冲区中所有完整的消息帧，同一账户的订单合并为一次批量处理，
+    回复合并后一次发送，客户端可以不等待回复连续发送订单
+    """
+
+    def setup(self):
+        self.gateway = self.server.gateway
+        self.codec = None
+        self.token = None                   # 登录的账户
+        self.sub = None                     # 推送订阅
+        self._send_lock = Lock()
+
+    def handle(self):
+        sock = self.request
+        if sock.family != getattr(socket, "AF_UNIX", None):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        # 协商编码方式
+        name = sock.recv(1)
+        if not name:
+            return
+        if name == CODEC_MSGPACK and msgpack is None:
+            name = CODEC_JSON
+        self.codec = Codec(name)
+        sock.sendall(name)
+
+        buf = bytearray()
+        while True:
+            try:
+                data = sock.recv(65536)
+            except OSError:
+                break
+            if not data:
+                break
+            buf += data
+
+            # 解析缓冲区中所有完整的消息帧
+            msgs = list()
+            pos = 0
+            oversize = False
+            while len(buf) - pos >= HEADER.size:
+                size, = HEADER.unpack_from(buf, pos)
+                if size > SETTINGS['GATEWAY_MAX_FRAME']:
+                    # 消息长度超出限制，处理已解析的消息后关闭连接，不再缓存后续数据
+                    oversize = True
+                    break
+                if len(buf) - pos - HEADER.size < size:
+                    break
+                start = pos + HEADER.size
+                try:
+                    msgs.append(self.codec.decode(bytes(buf[start:start + size])))
+                except Exception:
+                    # 解码失败的消息回复格式错误，不影响同一批的其他消息
+                    msgs.append(None)
+                pos = start + size
+            del buf[:pos]
+
+            batch = SETTINGS['GATEWAY_BATCH']
+            for i in range(0, len(msgs), batch):
+                self.send(self.process(msgs[i:i + batch]))
+
+            if oversize:
+                self.send([ack(None, False, "消息长度超出限制")])
+                break
+
+    def finish(self):
+        if self.sub:
+            self.gateway.main_engine.push_engine.unsubscribe(self.sub)
+
+    def send(self, msgs: list):
+        """发送消息"""
+        if not msgs:
+            return
+        data = b"".join(self.codec.pack(msg) for msg in msgs)
+        with self._send_lock:
+            self.request.sendall(data)
+
+    def process(self, msgs: list):
+        """处理一批消息，返回回复列表"""
+        replies = list()
+        orders = list()
+        cancels = list()
+
+        for msg in msgs:
+            if not isinstance(msg, dict):
+                replies.append(ack(None, False, "消息格式错误"))
+                continue
+            op = msg.get("op")
+            seq = msg.get("seq")
+            try:
+                if op == "send":
+                    if not self.token:
+                        raise ValueError("账户未登录")
+                    d = msg["order"]
+                    d.setdefault("account_id", self.token)
+                    if d["account_id"] != self.token:
+                        raise ValueError("订单账户与登录账户不一致")
+                    orders.append((seq, new_order_generate(d)))
+                elif op == "cancel":
+                    if not self.token:
+                        raise ValueError("账户未登录")
+                    cancels.append((seq, msg["order_id"]))
+                elif op == "login":
+                    replies.append(self.on_login(seq, msg["token"]))
+                elif op == "ping":
+                    replies.append({"op": "pong", "seq": seq})
+                else:
+                    raise ValueError("未知的消息类型")
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                replies.append(ack(seq, False, str(e) if isinstance(e, ValueError) else "消息格式错误"))
+
+        if orders:
+            replies.extend(self.on_orders(orders))
+        if cancels:
+            replies.extend(self.on_cancels(cancels))
+
+        return replies
+
+    def on_login(self, seq, token: str):
+        """账户登录并订阅推送"""
+        main_engine = self.gateway.main_engine
+        account = main_engine.account_engine.login(token)
+        if not account:
+            return ack(seq, False, "账户不存在")
+
+        if self.sub:
+            main_engine.push_engine.unsubscribe(self.sub)
+        self.token = token
+        self.sub = main_engine.push_engine.subscribe(token)
+        Thread(target=self.run_push, args=(self.sub,), daemon=True).start()
+
+        return ack(seq, True, account)
+
+    def on_orders(self, items: list):
+        """批量接收订单"""
+        main_engine = self.gateway.main_engine
+        results = main_engine.on_orders_arrived_batch(self.token, [order for seq, order in items])
+
+        replies = list()
+        accepted = list()
+        for (seq, order), (result, msg) in zip(items, results):
+            if result:
+                accepted.append(msg)
+                replies.append(ack(seq, True, {"order_id": msg.order_id}))
+            else:
+                replies.append(ack(seq, False, msg))
+
+        # 将订单一次性送入交易引擎
+        if accepted:
+            main_engine.order_put_batch(accepted)
+
+        return replies
+
+    def on_cancels(self, items: list):
+        """批量撤单"""
+        main_engine = self.gateway.main_engine
+        status, orders = main_engine.account_engine.query_open_orders(
+            self.token, order_ids=[order_id for seq, order_id in items]
+        )
+        if not status:
+            return [ack(seq, False, orders) for seq, order_id in items]
+
+        open_orders = {o['order_id']: o for o in orders}
+        cancel_orders = [
+            cancel_order_generate(self.token, o['order_id'], code=o['code'], exchange=o['exchange'])
+            for o in orders
+        ]
+        results = dict(zip(
+            [order.order_id for order in cancel_orders],
+            main_engine.order_cancel_batch(cancel_orders)
+        ))
+
+        replies = list()
+        for seq, order_id in items:
+            if order_id not in open_orders:
+                replies.append(ack(seq, False, "无此未完成订单"))
+            elif results.get(order_id):
+                replies.append(ack(seq, True, "撤单成功"))
+            else:
+                replies.append(ack(seq, False, "撤单失败"))
+
+        return replies
+
+    def run_push(self, sub):
+        """将订阅的推送消息发送给客户端"""
+        while sub.active:
+            msg = sub.get(SETTINGS['PUSH_HEARTBEAT'])
+            if msg is None:
+                continue
+            try:
+                self.send([{"op": msg['type'], "data": msg['data']}])
+            except OSError:
+                break
+
+
+def ack(seq, status: bool, data):
+    """生成回复消息"""
+    return {"op": "ack", "seq": seq, "status": status, "data": data}
+
+
+class GatewayTCPServer(socketserver.ThreadingTCPServer):
+    """TCP网关服务"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class GatewayUnixServer(socketserver.ThreadingUnixStreamServer):
+        """Unix socket网关服务"""
+        daemon_threads = True
+else:
+    GatewayUnixServer = None
+
+
+class OrderGateway:
+    """
+    订单网关
+    在TCP或Unix socket上提供长连接的订单接收通道，
+    消息使用长度前缀帧，优先使用msgpack编码，支持流水线发送订单及异步接收成交推送
+    """
+
+    def __init__(self, main_engine):
+        self.main_engine = main_engine              # 主引擎
+        self.event_engine = main_engine.event_engine
+
+        unix_path = SETTINGS.get('GATEWAY_UNIX_PATH')
+        if unix_path:
+            if GatewayUnixServer is None:
+                raise ValueError("当前系统不支持Unix socket")
+            if os.path.exists(unix_path):
+                os.remove(unix_path)
+            self.address = unix_path
+            self.server = GatewayUnixServer(unix_path, GatewayHandler)
+        else:
+            address = (SETTINGS['GATEWAY_HOST'], SETTINGS['GATEWAY_PORT'])
+            self.address = f"{address[0]}:{address[1]}"
+            self.server = GatewayTCPServer(address, GatewayHandler)
+        self.server.gateway = self
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """启动网关"""
+        self._thread.start()
+        self.write_log(f"订单网关：启动，监听{self.address}")
+
+    def close(self):
+        """关闭网关"""
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+
+    def _run(self):
+        try:
+            self.server.serve_forever()
+        except Exception:
+            self.event_engine.put(Event(EVENT_ERROR, traceback.format_exc()))
+
+    def write_log(self, msg: str, level: int = logging.INFO):
+        """"""
+        log = LogData(
+            log_content=msg,
+            log_level=level
+        )
+        event = Event(EVENT_LOG, log)
+        self.event_engine.put(event)
@@ -1,16 +1,50 @@
 import copy
 import traceback
-from queue import Queue
-from time import sleep
+from queue import Queue, Empty
+from time import perf_counter
+from threading import Condition, Lock
 from logging import INFO
-from datetime import datetime, time
+from datetime import datetime
 from collections import OrderedDict
 
+import numpy as np
+
 from paper_trading.event import Event
-from paper_trading.utility.event import EVENT_ERROR, EVENT_LOG, EVENT_MARKET_CLOSE
-from paper_trading.utility.model import Order, Status, LogData
+from paper_trading.utility.event import EVENT_ERROR, EVENT_LOG, EVENT_MARKET_CLOSE, EVENT_TICK
+from paper_trading.utility.model import Order, Status, LogData, Tick
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.trade.trade_calendar import TradingCalendar
+from paper_trading.trade.quote_engine import LEVELS, tick_generate
 from paper_trading.utility.constant import OrderType, PriceType, TradeType
 
+# 行情盘口数量的单位（手）对应的股数
+LOT = 100
+
+
+def depth_fill(prices, available, need: float, limit: float = None, buy: bool = True):
+    """
+    按盘口深度逐档计算成交数量
+    :param prices: 一至五档价格数组
+    :param available: 各档剩余可成交数量数组
+    :param need: 需要成交的数量
+    :param limit: 限价，市价委托为None
+    :param buy: 买入时与卖盘成交，价格不高于限价的档位可以成交，卖出时相反
+    :return: (各档成交数量, 成交数量, 成交均价)
+    """
+    eligible = prices > 0
+    if limit is not None:
+        eligible &= (prices <= limit) if buy else (prices >= limit)
+    # 某一档不能成交时，之后的档位也不能成交
+    available = np.where(np.logical_and.accumulate(eligible), available, 0)
+
+    # 每一档成交min(该档剩余数量, 前几档成交后还需要的数量)
+    take = np.clip(need - (np.cumsum(available) - available), 0, available)
+    volume = float(take.sum())
+    if not volume:
+        return take, 0, 0
+
+    return take, volume, float(take @ prices) / volume
+
 
 class Exchange:
     """
@@ -23,6 +57,9 @@ class Exchange:
         self.market_name = ""  # 市场名称
         self._active = False  # 市场状态标识
         self.orders_book = OrderedDict()  # 订单薄用于成交撮合
+        self.symbol_book = dict()  # 按证券代码索引的订单薄
+        self.depth_consumed = dict()  # 按证券代码记录当前行情快照中各档已成交的数量
+        self._book_lock = Lock()  # 订单薄锁
 
         # 事件引擎
         self.event_engine = event_engine
@@ -33,10 +70,22 @@ class Exchange:
         # 行情源实例
         self.hq_client = hq_ser
 
+        # 交易所时钟，回放行情时使用行情源的回放时间及倍速
+        self.clock = getattr(hq_ser, "now", None) or datetime.now
+        self.speed = getattr(hq_ser, "speed", 1)
+
         self.exchange_symbols = []  # 交易市场标识
         self.turnover_mode = None  # 回转交易模式
         self.verification = OrderedDict()  # 订单验证清单
 
+        # 交易日历
+        self.calendar = param.get("calendar") or TradingCalendar()
+
+        # 撮合唤醒，订单到达时立即唤醒等待中的撮合程序
+        self._wakeup = Condition()
+        self._pending = False
+        self._arrived = list()  # 上次撮合后新到达的订单
+
     def on_init(self):
         """初始化"""
         # 开启交易撮合开关
@@ -45,6 +94,10 @@ class Exchange:
         # 注册验证程序
         self.verification_register()
 
+        # 行情驱动撮合
+        if SETTINGS.get('TICK_MATCHING'):
+            self.event_engine.register(EVENT_TICK, self.on_tick)
+
         # 返回订单接收函数
         return self.on_orders_arrived
 
@@ -52,18 +105,84 @@ class Exchange:
         """订单撮合"""
         pass
 
+    def stop(self):
+        """停止撮合"""
+        self._active = False
+        self.wakeup()
+
+    def wakeup(self, orders: list = None):
+        """
+        唤醒撮合程序
+        :param orders: 新到达的订单
+        """
+        with self._wakeup:
+            if orders:
+                self._arrived.extend(orders)
+            self._pending = True
+            self._wakeup.notify_all()
+
+    def take_arrived(self):
+        """取出上次撮合后新到达的订单"""
+        with self._wakeup:
+            arrived = self._arrived
+            self._arrived = list()
+        return arrived
+
+    def wait(self, timeout: float = None):
+        """等待指定的秒数，被唤醒时立即返回"""
+        if timeout is not None:
+            timeout = timeout / self.speed
+        with self._wakeup:
+            if not self._pending and self._active:
+                self._wakeup.wait(timeout)
+            self._pending = False
+
+    def on_tick(self, event):
+        """行情快照到达，只撮合该证券的订单"""
+        tick = event.data
+        if not self._active or not self.calendar.is_open(self.clock()):
+            return
+
+        for order in self.book_orders(tick.pt_symbol):
+            if self.on_orders_match(order, tick):
+                self.book_pop(order.order_id)
+
     def on_orders_arrived(self, order):
         """订单到达"""
         pass
 
-    def on_orders_match(self, order: Order):
-        """订单撮合"""
+    def on_orders_arrived_batch(self, orders: list):
+        """批量订单到达"""
+        return [self.on_orders_arrived(order) for order in orders]
+
+    def on_orders_cancel_batch(self, orders: list):
+        """批量撤单"""
+        return [self.on_orders_arrived(order) for order in orders]
+
+    def get_tick(self, symbol: str):
+        """查询证券的行情快照，没有行情时返回None"""
+        hq = self.hq_client.get_realtime_data(symbol)
+        if len(hq):
+            d = hq.iloc[0].to_dict()
+            d['pt_symbol'] = symbol
+            return tick_generate(d)
+
+    def on_orders_match(self, order: Order, tick: Tick = None):
+        """
+        订单撮合
+        :param tick: 行情快照，为None时查询订单证券的最新行情
+        """
         try:
-            hq = self.hq_client.get_realtime_data(order.pt_symbol)
+            if tick is None:
+                tick = self.get_tick(order.pt_symbol)
+
+            if tick is not None:
+                # 按盘口深度撮合
+                if SETTINGS['VOLUME_SIMULATION']:
+                    return self.on_depth_match(order, tick)
 
-            if len(hq):
-                ask1 = round(hq.loc[0, "ask1"], 5)
-                bid1 = round(hq.loc[0, "bid1"], 5)
+                ask1 = round(tick.ask[0], 5)
+                bid1 = round(tick.bid[0], 5)
 
                 if order.order_type == OrderType.BUY.value:
                     # 涨停
@@ -103,12 +222,71 @@ class Exchange:
             self.write_log(traceback.format_exc())
             return False
 
-    def on_order_deal(self, order: Order):
-        """订单成交"""
-        order.traded = order.volume
+    def on_depth_match(self, order: Order, tick: Tick):
+        """
+        按盘口深度撮合，逐档消耗可成交数量，盘口数量不足时部分成交
+        :return: 订单全部成交时返回True
+        """
+        buy = order.order_type == OrderType.BUY.value
+        if order.price_type == PriceType.MARKET.value:
+            limit = None
+        elif order.price_type == PriceType.LIMIT.value:
+            limit = round(order.order_price, 5)
+        else:
+            return
+
+        if buy:
+            prices, volumes = tick.ask, tick.ask_volume
+        else:
+            prices, volumes = tick.bid, tick.bid_volume
+        prices = np.round(np.array(prices[:LEVELS], dtype=float), 5)
+        consumed = self.get_depth_consumed(tick, buy)
+        available = np.array(volumes[:LEVELS], dtype=float) * LOT - consumed
+
+        take, volume, price = depth_fill(prices, available, order.volume - order.traded, limit, buy)
+        if not volume:
+            return
+
+        consumed += take
+        self.on_order_deal(order, volume, round(price, 5))
+        return order.traded >= order.volume
+
+    def get_depth_consumed(self, tick: Tick, buy: bool):
+        """
+        当前行情快照中各档已成交的数量，盘口变化后重新计算
+        同一快照内撮合的多个订单依次消耗盘口，不会重复成交
+        """
+        key = (tick.tick_time, tuple(tick.ask), tuple(tick.ask_volume), tuple(tick.bid), tuple(tick.bid_volume))
+        depth = self.depth_consumed.get(tick.pt_symbol)
+        if depth is None or depth[0] != key:
+            depth = self.depth_consumed[tick.pt_symbol] = (key, np.zeros(LEVELS), np.zeros(LEVELS))
+
+        return depth[1] if buy else depth[2]
+
+    def on_order_deal(self, order: Order, volume: float = None, price: float = None):
+        """
+        订单成交
+        :param volume: 本次成交数量，为None时订单全部成交
+        :param price: 本次成交价格
+        """
         order.trade_type = self.turnover_mode
 
-        self.account_engine.orders_deal(order)
+        if volume is None:
+            order.traded = order.volume
+            self.account_engine.orders_deal(order)
+            return
+
+        # 部分成交，更新累计成交数量及成交均价
+        amount = order.traded * order.trade_price + volume * price
+        order.traded += volume
+        order.trade_price = round(amount / order.traded, 5)
+        if order.traded >= order.volume:
+            order.status = Status.ALLTRADED.value
+        else:
+            order.status = Status.PARTTRADED.value
+
+        # 订单仍在订单薄中，账户引擎使用成交时的订单副本
+        self.account_engine.orders_deal(copy.copy(order), volume, price)
 
     def on_order_cancel(self, order: Order):
         """订单被取消"""
@@ -122,16 +300,56 @@ class Exchange:
         """订单状态变化"""
         self.account_engine.orders_status_update(order)
 
+    """订单薄"""
+
+    def book_add(self, orders: list):
+        """添加订单到订单薄"""
+        with self._book_lock:
+            for order in orders:
+                self.orders_book[order.order_id] = order
+                self.symbol_book.setdefault(order.pt_symbol, OrderedDict())[order.order_id] = order
+
+    def book_pop(self, order_id: str):
+        """从订单薄中移除订单，订单不存在时返回None"""
+        with self._book_lock:
+            order = self.orders_book.pop(order_id, None)
+            if order is not None:
+                orders = self.symbol_book.get(order.pt_symbol)
+                if orders is not None:
+                    orders.pop(order_id, None)
+                    if not orders:
+                        del self.symbol_book[order.pt_symbol]
+            return order
+
+    def book_orders(self, symbol: str = None):
+        """订单薄中的订单列表，指定证券代码时只返回该证券的订单"""
+        with self._book_lock:
+            if symbol is None:
+                return list(self.orders_book.values())
+            return list(self.symbol_book.get(symbol, {}).values())
+
+    def book_symbols(self):
+        """订单薄中有挂单的证券代码"""
+        with self._book_lock:
+            return set(self.symbol_book.keys())
+
+    def book_clear(self):
+        """清空订单薄"""
+        with self._book_lock:
+            self.orders_book.clear()
+            self.symbol_book.clear()
+            self.depth_consumed.clear()
+
     def load_data(self):
         """加载订单"""
         orders_book = self.account_engine.load_data()
-        self.orders_book.update(orders_book)
+        self.book_add(list(orders_book.values()))
         self.write_log(f"加载未处理订单共计：{str(len(self.orders_book))}条")
 
     def on_refused_all(self):
         """拒绝所有订单"""
         if self.orders_book:
-            for order in self.orders_book.values():
+            for order in self.book_orders():
                 order.status = Status.REJECTED.value
                 order.error_msg = "交易关闭，自动拒单"
                 self.on_order_refused(order)
@@ -142,13 +360,20 @@ class Exchange:
                     )
                 )
 
-        self.orders_book.clear()
+        self.book_clear()
 
     def liquidation(self):
         """收盘清算"""
-        self.account_engine.liquidation(self.hq_client)
+        liq_date = self.clock().strftime("%Y%m%d")
+        if not self.calendar.is_trade_date(liq_date):
+            self.write_log("{}: 非交易日，不进行清算".format(self.market_name))
+            return
+
+        start = perf_counter()
+        success, failed = self.account_engine.liquidation(self.hq_client, liq_date)
 
-        self.write_log("{}: 账户与持仓清算完成".format(self.market_name))
+        self.write_log("{}: 账户与持仓清算完成，成功{}个，失败{}个，耗时{:.2f}秒".format(
+            self.market_name, success, failed, perf_counter() - start))
 
     def on_close(self):
         """模拟交易市场关闭"""
@@ -176,14 +401,10 @@ class Exchange:
 
     def time_verification(self):
         """交易时间验证"""
-        result = False
-        now = datetime.now().time()
-        time_dict = {"1": (time(9, 15), time(11, 30)), "2": (time(13, 0), time(15, 0))}
-        for k, time_check in time_dict.items():
-            if (now >= time_check[0]) and (now <= time_check[1]):
-                result = True
-
-        if now >= time(15, 0):
+        now = self.clock()
+        result = self.calendar.is_open(now)
+
+        if self.calendar.is_closed(now):
             # 市场关闭
             self.on_close()
 
@@ -250,11 +471,11 @@ class BacktestMarket(Exchange):
 
         try:
             while self._active:
-                if self.orders_queue.empty():
+                try:
+                    order = self.orders_queue.get(timeout=1)
+                except Empty:
                     continue
 
-                order = self.orders_queue.get(block=True)
-
                 # 订单成交
                 # 回测使用委托价格作为成交价格
                 order.trade_price = order.order_price
@@ -298,21 +519,45 @@ class ChinaAMarket(Exchange):
             # 加载数据
             self.load_data()
 
+            last_round = None
             while self._active:
-                # 交易时间检验
-                if not self.time_verification():
+                now = self.clock()
+                arrived = self.take_arrived()
+
+                # 当日交易时段结束，市场关闭
+                if self.calendar.is_closed(now):
+                    self.on_close()
+                    break
+
+                # 非交易时段，等待到下一个交易时段开始
+                wait = self.calendar.session_wait(now)
+                if wait:
+                    self.wait(wait)
                     continue
 
-                if not self.orders_book:
+                # 没有订单时等待订单到达，最长等待到当前交易时段结束，
+                # 行情驱动撮合时订单在on_tick中撮合
+                if SETTINGS.get('TICK_MATCHING') or not self.orders_book:
+                    self.wait(self.calendar.session_remain(now) + 0.01)
                     continue
 
-                # 复制交易簿
-                orders = copy.copy(self.orders_book)
-                for order_id, order in orders.items():
-                    sleep(1)
+                # 每PERIOD秒撮合一轮订单薄中的全部订单，
+                # 两轮之间被唤醒时只撮合新到达的订单，避免订单频繁到达时反复查询全部挂单的行情
+                if last_round is None or (perf_counter() - last_round) * self.speed >= SETTINGS['PERIOD']:
+                    orders = self.book_orders()
+                    last_round = perf_counter()
+                else:
+                    orders = [order for order in arrived if order.order_id in self.orders_book]
+
+                for order in orders:
+                    if not self._active:
+                        break
                     # 订单撮合
                     if self.on_orders_match(order):
-                        del self.orders_book[order_id]
+                        self.book_pop(order.order_id)
+
+                # 等待下一轮撮合，有新订单到达时提前撮合新订单
+                self.wait(max(SETTINGS['PERIOD'] - (perf_counter() - last_round) * self.speed, 0))
 
         except Exception as e:
             event = Event(EVENT_ERROR, traceback.format_exc())
@@ -324,8 +569,7 @@ class ChinaAMarket(Exchange):
 
         # 取消订单的处理
         if order.order_type == OrderType.CANCEL.value:
-            if self.orders_book.get(order_id):
-                del self.orders_book[order_id]
+            if self.book_pop(order_id):
                 self.on_order_cancel(order)
                 return True
             else:
@@ -343,9 +587,44 @@ class ChinaAMarket(Exchange):
                 self.on_order_status_update(order)
                 self.write_log(f"收到订单:{order_id}")
                 # 将订单添加到订单薄
-                self.orders_book[order_id] = order
+                self.book_add([order])
+                self.wakeup([order])
                 return True
 
+    def on_orders_cancel_batch(self, orders: list):
+        """批量撤单-真实行情，一次遍历将订单从订单薄中移除"""
+        results = list()
+        for order in orders:
+            if self.book_pop(order.order_id):
+                self.on_order_cancel(order)
+                results.append(True)
+            else:
+                results.append(False)
+
+        return results
+
+    def on_orders_arrived_batch(self, orders: list):
+        """批量订单到达-真实行情，验证通过的订单一次性添加到订单薄"""
+        results = list()
+        accepted = list()
+        for order in orders:
+            if order.order_type in [OrderType.CANCEL.value, OrderType.LIQ.value]:
+                results.append(self.on_orders_arrived(order))
+            elif not self.on_back_verification(order):
+                results.append(False)
+            else:
+                order.status = Status.NOTTRADED.value
+                self.on_order_status_update(order)
+                accepted.append(order)
+                results.append(True)
+
+        if accepted:
+            self.write_log(f"收到批量订单:{len(accepted)}条")
+            self.book_add(accepted)
+            self.wakeup(accepted)
+
+        return results
+
     def verification_register(self):
         """验证注册"""
         self.verification = {
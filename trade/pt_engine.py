@@ -1,7 +1,9 @@
 
 import logging
 import smtplib
+import traceback
 from abc import ABC
+from datetime import datetime
 from queue import Empty, Queue
 from threading import Thread
 from email.message import EmailMessage
@@ -9,6 +11,7 @@ from email.message import EmailMessage
 from paper_trading.event import EventEngine, Event
 from paper_trading.api.db import MongoDBService
 from paper_trading.api.pytdx_api import PYTDXService
+from paper_trading.api.quote_replay import QuoteRecorder, RecordedQuoteService, ReplayQuoteService
 from paper_trading.utility.setting import SETTINGS
 from paper_trading.utility.model import LogData
 from paper_trading.utility.event import (
@@ -18,7 +21,14 @@ from paper_trading.utility.event import (
 )
 from paper_trading.utility.constant import PersistanceMode
 from paper_trading.trade.market import ChinaAMarket
+from paper_trading.trade.trade_calendar import TradingCalendar
 from paper_trading.trade.account_engine import AccountEngine
+from paper_trading.trade.account_shard import ShardedAccountEngine
+from paper_trading.trade.push_engine import PushEngine
+from paper_trading.trade.quote_engine import QuoteEngine
+from paper_trading.trade.report_builder import close_report_pool
+from paper_trading.trade.gateway import OrderGateway
+from paper_trading.tasks.stocks import sync_trade_cal
 
 
 
@@ -41,8 +51,17 @@ class MainEngine():
         self.__active = False                       # 主引擎状态
         self.pst_active = None                      # 数据持久化开关
         self._market = market                       # 交易市场
+        self.db = None                              # 数据库实例
+        self.calendar = None                        # 交易日历
         self.account_engine = None                  # 账户引擎
+        self.push_engine = None                     # 推送引擎
+        self.quote_engine = None                    # 行情引擎
+        self.quote_recorder = None                  # 行情录制
+        self.replay_client = None                   # 回放行情源
+        self.gateway = None                         # 订单网关
         self.order_put = None                       # 订单回调函数
+        self.order_put_batch = None                 # 批量订单回调函数
+        self.order_cancel_batch = None              # 批量撤单回调函数
 
 
         # 更新参数
@@ -85,50 +104,118 @@ class MainEngine():
         else:
             raise ValueError("持久化参数错误")
 
+        # 订单网关通过推送服务向客户端发送成交信息
+        if self._settings.get('GATEWAY_ACTIVE'):
+            self._settings['PUSH_ACTIVE'] = True
+
         # 连接数据库
         db = self.creat_db()
+        self.db = db
 
         # 连接行情
         hq_client = self.creat_hq_api()
 
         # 账户引擎启动
-        self.account_engine = AccountEngine(self.event_engine,
-                                            self.pst_active,
-                                            self._settings['LOAD_DATA_MODE'],
-                                            db)
+        shard_num = self._settings.get('ACCOUNT_SHARDS', 0)
+        if shard_num > 1:
+            self.account_engine = ShardedAccountEngine(self.event_engine,
+                                                       self.pst_active,
+                                                       self._settings['LOAD_DATA_MODE'],
+                                                       db,
+                                                       shard_num)
+        else:
+            self.account_engine = AccountEngine(self.event_engine,
+                                                self.pst_active,
+                                                self._settings['LOAD_DATA_MODE'],
+                                                db)
         self.account_engine.start()
 
+        # 推送引擎启动
+        if self._settings.get('PUSH_ACTIVE'):
+            self.push_engine = PushEngine(self.event_engine)
+
+        # 交易日历，数据库中没有当天的交易日历时（例如首次部署）先同步一次
+        calendar = TradingCalendar.load(db)
+        self.calendar = calendar
+        if not calendar.in_range(datetime.now().strftime("%Y%m%d")):
+            self.sync_calendar()
+
         # 默认使用ChinaAMarket
         if not self._market or isinstance(self._market, ChinaAMarket):
             self._market = ChinaAMarket(self.event_engine,
                                         self.account_engine,
                                         hq_client,
-                                        {})
+                                        {"calendar": calendar})
         else:
             self._market = self._market(self.event_engine,
                                         self.account_engine,
                                         hq_client,
-                                        {})
+                                        {"calendar": calendar})
 
         # 交易市场初始化，并返回订单推送函数
         self.order_put = self._market.on_init()
+        self.order_put_batch = self._market.on_orders_arrived_batch
+        self.order_cancel_batch = self._market.on_orders_cancel_batch
 
         # 启动订单薄撮合程序
         self._thread.start()
         self.__active = True
 
+        # 启动行情引擎，查询订单薄中有挂单的证券的行情
+        if self._settings.get('TICK_MATCHING'):
+            self.quote_engine = QuoteEngine(self.event_engine, self.creat_hq_api(), calendar)
+            self.quote_engine.add_source(self._market.book_symbols)
+            self.quote_engine.start()
+
+        # 启动订单网关
+        if self._settings.get('GATEWAY_ACTIVE'):
+            self.gateway = OrderGateway(self)
+            self.gateway.start()
+
         return self
 
+    def sync_calendar(self):
+        """同步交易日历到数据库，有数据更新时重新加载引擎中的交易日历"""
+        if not self.calendar:
+            return
+
+        try:
+            days = sync_trade_cal()
+        except Exception:
+            self.write_log(f"交易日历同步失败：{traceback.format_exc()}", level=logging.WARNING)
+            return
+
+        if days and self.calendar.reload(self.db):
+            self.write_log(f"交易日历：已更新至{self.calendar.trade_days[-1]}")
+
     def _run(self):
         """订单薄撮合程序启动"""
         self._market.on_match()
 
     def _close(self):
         """模拟交易引擎关闭"""
+        # 关闭订单网关
+        if self.gateway:
+            self.gateway.close()
+
+        # 关闭行情引擎
+        if self.quote_engine:
+            self.quote_engine.close()
+
         # 关闭市场
-        self._market._active = False
+        self._market.stop()
         self._thread.join()
 
+        # 关闭账户引擎
+        self.account_engine.close()
+
+        # 关闭行情录制
+        if self.quote_recorder:
+            self.quote_recorder.close()
+
+        # 关闭报表进程池
+        close_report_pool()
+
         self.__active = False
 
         self.write_log("模拟交易主引擎：关闭")
@@ -146,6 +233,13 @@ class MainEngine():
         else:
             return False, "交易市场关闭"
 
+    def on_orders_arrived_batch(self, token: str, orders: list):
+        """批量订单到达处理"""
+        if self.__active:
+            return self.account_engine.orders_arrived_batch(token, orders)
+        else:
+            return [(False, "交易市场关闭") for order in orders]
+
     def process_market_close(self, event):
         """市场关闭处理"""
         market_name = event.data
@@ -168,9 +262,24 @@ class MainEngine():
 
     def creat_hq_api(self):
         """实例化行情源"""
+        # 回放行情，交易市场与行情引擎共用同一个回放时钟
+        if self._settings.get('QUOTE_REPLAY'):
+            if not self.replay_client:
+                self.replay_client = ReplayQuoteService(self._settings['QUOTE_DIR'],
+                                                        self._settings['QUOTE_REPLAY'],
+                                                        self._settings.get('REPLAY_SPEED', 1))
+                self.replay_client.connect_api()
+            return self.replay_client
+
         tdx = PYTDXService(self.creat_db().db_client)
         tdx.connect_api()
 
+        # 录制行情
+        if self._settings.get('QUOTE_RECORD'):
+            if not self.quote_recorder:
+                self.quote_recorder = QuoteRecorder(self._settings['QUOTE_DIR'])
+            return RecordedQuoteService(tdx, self.quote_recorder)
+
         return tdx
 
     def write_log(self, msg: str, level: int = logging.INFO):
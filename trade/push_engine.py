@@ -0,0 +1,207 @@
+
+import asyncio
+import logging
+from collections import deque
+from threading import Condition, Lock
+
+from paper_trading.event import Event
+from paper_trading.utility.model import LogData
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.utility.serializer import dumps
+from paper_trading.utility.event import (
+    EVENT_LOG,
+    EVENT_ORDER_UPDATE,
+    EVENT_ORDER_STATUS_UPDATE,
+    EVENT_ACCOUNT_UPDATE
+)
+
+
+class Subscriber:
+    """
+    推送订阅者
+    消息缓存在固定长度的队列中，队列满时丢弃最早的消息，
+    消费过慢的订阅者不会阻塞事件引擎
+    """
+
+    def __init__(self, token: str, size: int):
+        self.token = token                      # 订阅的账户
+        self.queue = deque(maxlen=size)         # 消息队列
+        self.dropped = 0                        # 被丢弃的消息数量
+        self.active = True                      # 订阅状态
+        self._cond = Condition()
+
+    def put(self, msg: dict):
+        """放入消息"""
+        with self._cond:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(msg)
+            self._cond.notify()
+
+    def get(self, timeout: float):
+        """
+        取出消息
+        有消息被丢弃时先返回overflow消息，客户端需要重新查询订单状态
+        :return: 消息，超时或订阅关闭时返回None
+        """
+        with self._cond:
+            if not self.queue and self.active:
+                self._cond.wait(timeout)
+
+            if self.dropped:
+                msg = {"type": "overflow", "data": {"dropped": self.dropped}}
+                self.dropped = 0
+                return msg
+
+            if self.queue:
+                return self.queue.popleft()
+
+    def close(self):
+        """关闭订阅"""
+        with self._cond:
+            self.active = False
+            self._cond.notify_all()
+
+
+class AsyncSubscriber:
+    """
+    异步推送订阅者
+    事件引擎线程通过loop.call_soon_threadsafe将消息放入事件循环中的asyncio.Queue，
+    等待消息时不占用线程，队列满时同样丢弃最早的消息
+    """
+
+    def __init__(self, token: str, size: int, loop):
+        self.token = token                      # 订阅的账户
+        self.size = size                        # 最多缓存的消息数量
+        self.loop = loop                        # 订阅者所在的事件循环
+        self.queue = asyncio.Queue()            # 消息队列，只在事件循环中读写
+        self.dropped = 0                        # 被丢弃的消息数量
+        self.active = True                      # 订阅状态
+
+    def put(self, msg: dict):
+        """放入消息，可以在任意线程中调用"""
+        if not self.active:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._put, msg)
+        except RuntimeError:
+            # 事件循环已关闭
+            self.active = False
+
+    def _put(self, msg: dict):
+        if self.queue.qsize() >= self.size:
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(msg)
+
+    async def get(self, timeout: float):
+        """
+        取出消息
+        有消息被丢弃时先返回overflow消息，客户端需要重新查询订单状态
+        :return: 消息，超时时返回None
+        """
+        if self.dropped:
+            msg = {"type": "overflow", "data": {"dropped": self.dropped}}
+            self.dropped = 0
+            return msg
+
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        """关闭订阅"""
+        self.active = False
+
+
+def sse_message(msg: dict):
+    """推送消息转换为SSE格式，msg为None时返回心跳"""
+    if msg is None:
+        return b": heartbeat\n\n"
+    return b"event: " + msg['type'].encode() + b"\ndata: " + dumps(msg['data']) + b"\n\n"
+
+
+class PushEngine:
+    """
+    推送引擎
+    监听订单更新、订单状态更新及账户更新事件，按账户分发给订阅者
+    """
+
+    def __init__(self, event_engine):
+        self.event_engine = event_engine        # 事件引擎
+        self.subscribers = dict()               # 订阅者字典，key为token
+        self._lock = Lock()
+
+        self.event_register()
+
+        self.write_log("推送引擎：初始化完毕")
+
+    def event_register(self):
+        """注册事件监听"""
+        self.event_engine.register(EVENT_ORDER_UPDATE, self.process_order_update)
+        self.event_engine.register(EVENT_ORDER_STATUS_UPDATE, self.process_order_status_update)
+        self.event_engine.register(EVENT_ACCOUNT_UPDATE, self.process_account_update)
+
+    def subscribe(self, token: str, loop=None):
+        """
+        订阅账户推送
+        :param loop: 异步订阅者所在的事件循环，为None时返回在线程中阻塞等待的订阅者
+        """
+        if loop is None:
+            sub = Subscriber(token, SETTINGS['PUSH_QUEUE_SIZE'])
+        else:
+            sub = AsyncSubscriber(token, SETTINGS['PUSH_QUEUE_SIZE'], loop)
+        with self._lock:
+            self.subscribers.setdefault(token, []).append(sub)
+
+        return sub
+
+    def unsubscribe(self, sub):
+        """取消订阅"""
+        sub.close()
+        with self._lock:
+            subs = self.subscribers.get(sub.token, [])
+            if sub in subs:
+                subs.remove(sub)
+            if not subs:
+                self.subscribers.pop(sub.token, None)
+
+    def publish(self, token: str, msg: dict):
+        """向账户的所有订阅者推送消息"""
+        with self._lock:
+            subs = list(self.subscribers.get(token, []))
+
+        for sub in subs:
+            sub.put(msg)
+
+    def process_order_update(self, event):
+        """订单更新，包括成交"""
+        order = event.data
+        self.publish(order.account_id, {"type": "order", "data": dict(vars(order))})
+
+    def process_order_status_update(self, event):
+        """订单状态更新"""
+        data = event.data
+        self.publish(data['token'], {
+            "type": "status",
+            "data": {
+                "order_id": data['id'],
+                "status": data['status'],
+                "msg": data['msg']
+            }
+        })
+
+    def process_account_update(self, event):
+        """账户资金更新"""
+        data = event.data
+        self.publish(data['token'], {"type": "account", "data": data})
+
+    def write_log(self, msg: str, level: int = logging.INFO):
+        """"""
+        log = LogData(
+            log_content=msg,
+            log_level=level
+        )
+        event = Event(EVENT_LOG, log)
+        self.event_engine.put(event)
@@ -0,0 +1,126 @@
+
+import logging
+import traceback
+from datetime import datetime
+from threading import Thread, Event as ThreadEvent
+
+from paper_trading.event import Event
+from paper_trading.utility.model import Tick, LogData
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.utility.event import EVENT_TICK, EVENT_LOG, EVENT_ERROR
+
+# 盘口档位数量
+LEVELS = 5
+
+
+def tick_generate(d: dict):
+    """行情快照生成器，d为行情源返回的一行数据，pt_symbol为证券代码"""
+    code, exchange = d['pt_symbol'].split(".")
+    tick = Tick(
+        code=code,
+        exchange=exchange,
+        price=float(d['price']),
+        last_close=float(d.get('last_close', 0)),
+        open=float(d.get('open', 0)),
+        high=float(d.get('high', 0)),
+        low=float(d.get('low', 0)),
+        volume=float(d.get('vol', 0)),
+        amount=float(d.get('amount', 0)),
+        ask=[float(d.get(f'ask{i}', 0)) for i in range(1, LEVELS + 1)],
+        ask_volume=[float(d.get(f'ask_vol{i}', 0)) for i in range(1, LEVELS + 1)],
+        bid=[float(d.get(f'bid{i}', 0)) for i in range(1, LEVELS + 1)],
+        bid_volume=[float(d.get(f'bid_vol{i}', 0)) for i in range(1, LEVELS + 1)],
+        tick_time=str(d.get('servertime', "")),
+    )
+    return tick
+
+
+class QuoteEngine:
+    """
+    行情引擎
+    按固定间隔批量查询有挂单的证券及证券池的行情，以EVENT_TICK事件发布行情快照，
+    行情查询与订单撮合分离，多个交易市场可以共用同一个行情源
+    """
+
+    def __init__(self, event_engine, hq_client, calendar):
+        self.event_engine = event_engine        # 事件引擎
+        self.hq_client = hq_client              # 行情源实例
+        self.calendar = calendar                # 交易日历
+        self.sources = list()                   # 需要查询行情的证券代码来源
+
+        # 时钟，回放行情时使用行情源的回放时间及倍速
+        self.clock = getattr(hq_client, "now", None) or datetime.now
+        self.speed = getattr(hq_client, "speed", 1)
+
+        self._active = False
+        self._stop = ThreadEvent()
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def add_source(self, func):
+        """
+        添加证券代码来源
+        :param func: 返回证券代码集合的函数，一般为交易市场中有挂单的证券
+        """
+        self.sources.append(func)
+
+    def symbols(self):
+        """需要查询行情的证券代码"""
+        symbols = set(SETTINGS.get('TICK_UNIVERSE', []))
+        for func in self.sources:
+            symbols.update(func())
+
+        return symbols
+
+    def start(self):
+        """启动行情引擎"""
+        self._active = True
+        self._thread.start()
+        self.write_log("行情引擎：启动")
+
+    def close(self):
+        """关闭行情引擎"""
+        self._active = False
+        self._stop.set()
+        self._thread.join()
+
+    def poll(self):
+        """
+        批量查询一次行情并发布
+        :return: 发布的行情快照数量
+        """
+        symbols = self.symbols()
+        if not symbols:
+            return 0
+
+        df = self.hq_client.get_realtime_data_batch(list(symbols))
+        if not len(df):
+            return 0
+
+        for d in df.to_dict(orient='records'):
+            self.event_engine.put(Event(EVENT_TICK, tick_generate(d)))
+
+        return len(df)
+
+    def _run(self):
+        while self._active:
+            # 非交易时段，等待到下一个交易时段开始
+            wait = self.calendar.session_wait(self.clock())
+            if wait:
+                self._stop.wait(wait / self.speed)
+                continue
+
+            try:
+                self.poll()
+            except Exception:
+                self.event_engine.put(Event(EVENT_ERROR, traceback.format_exc()))
+
+            self._stop.wait(SETTINGS['TICK_PERIOD'] / self.speed)
+
+    def write_log(self, msg: str, level: int = logging.INFO):
+        """"""
+        log = LogData(
+            log_content=msg,
+            log_level=level
+        )
+        event = Event(EVENT_LOG, log)
+        self.event_engine.put(event)
@@ -0,0 +1,317 @@
+
+import math
+import traceback
+from itertools import repeat
+from threading import Lock
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from paper_trading.api.db import MongoDBService
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.utility.statistics import ANNUAL_DAYS, commission_cal, max_drawdown_cal
+from paper_trading.trade.db_model import (
+    query_account_one,
+    query_account_record,
+    query_pos_records,
+    query_orders
+)
+
+
+class ReportAccumulator:
+    """
+    报表累加器
+    保存计算交易结果报表所需的累计值，每次清算和成交时更新，查询报表时直接计算结果，
+    统计口径与客户端PaperTrading.data_statistics一致
+    """
+
+    def __init__(self, capital: float, cost: float, tax: float):
+        self.capital = capital              # 初始资金
+        self.cost = cost                    # 佣金费率
+        self.tax = tax                      # 印花税率
+
+        # 账户记录
+        self.start_date = ""                # 开始日期
+        self.end_date = ""                  # 结束日期
+        self.total_days = 0                 # 交易天数
+        self.profit_days = 0                # 盈利天数
+        self.loss_days = 0                  # 亏损天数
+        self.end_balance = capital          # 期末资产
+        self.peak = 0                       # 资产最高值
+        self.under_min = None               # 当前未恢复回撤区间的资产最低值
+        self.max_drawdown = 0               # 已恢复回撤区间的最大回撤
+
+        # 成交
+        self.commission = 0.                # 手续费合计
+        self.turnover = 0.                  # 成交量合计
+        self.trade_count = 0                # 成交笔数
+
+        # 持仓记录
+        self.pos_num = 0                    # 持仓记录数量
+        self.win_num = 0                    # 盈利数量
+        self.loss_num = 0                   # 亏损数量
+        self.profit_sum = 0.                # 盈亏合计
+        self.profit_sqsum = 0.              # 盈亏平方和
+
+    @classmethod
+    def from_records(cls, capital: float, cost: float, tax: float,
+                     account_records: list, pos_records: list, orders: list):
+        """由历史记录批量计算累计值"""
+        report = cls(capital, cost, tax)
+
+        assets_df = pd.DataFrame(account_records)
+        if len(assets_df):
+            assets = assets_df['assets'].values.astype(float)
+            net_pnl = assets - capital
+            report.start_date = assets_df['check_date'].iloc[0]
+            report.end_date = assets_df['check_date'].iloc[-1]
+            report.total_days = len(assets)
+            report.profit_days = int((net_pnl > 0).sum())
+            report.loss_days = int((net_pnl < 0).sum())
+            report.end_balance = float(assets[-1])
+            report.peak = max(float(assets.max()), 0)
+            report.max_drawdown = max_drawdown_cal(assets)
+
+            # 最后一个回撤区间尚未恢复时，记录区间内的最低值
+            peak = np.maximum.accumulate(assets)
+            underwater = assets < peak
+            if underwater[-1]:
+                group = np.cumsum(~underwater)
+                report.under_min = float(assets[group == group[-1]][1:].min())
+
+        trade_df = pd.DataFrame(orders)
+        if len(trade_df):
+            # 有成交的订单，包括部分成交后撤单或被拒单的订单
+            trade_df = trade_df[trade_df['traded'] > 0]
+            report.commission = float(commission_cal(trade_df, cost, tax).sum())
+            report.turnover = float(trade_df['traded'].sum())
+            report.trade_count = len(trade_df)
+
+        pos_df = pd.DataFrame(pos_records)
+        if len(pos_df):
+            profit = pos_df['profit'].dropna().values.astype(float)
+            report.pos_num = len(profit)
+            report.win_num = int((profit > 0).sum())
+            report.loss_num = int((profit <= 0).sum())
+            report.profit_sum = float(profit.sum())
+            report.profit_sqsum = float((profit * profit).sum())
+
+        return report
+
+    def on_account_record(self, check_date: str, assets: float):
+        """清算后新增账户记录"""
+        if not self.total_days:
+            self.start_date = check_date
+        self.end_date = check_date
+        self.total_days += 1
+
+        net_pnl = assets - self.capital
+        if net_pnl > 0:
+            self.profit_days += 1
+        elif net_pnl < 0:
+            self.loss_days += 1
+        self.end_balance = assets
+
+        if assets >= self.peak:
+            # 回到前高，回撤区间结束
+            if self.under_min is not None:
+                self.max_drawdown = max(self.max_drawdown, self.peak - self.under_min)
+                self.under_min = None
+            self.peak = assets
+        elif self.under_min is None or assets < self.under_min:
+            self.under_min = assets
+
+    def on_trade(self, order_type: str, volume: float, price: float, first: bool = True):
+        """
+        订单成交，部分成交时每次成交调用一次
+        :param volume: 本次成交数量
+        :param price: 本次成交价格
+        :param first: 是否为订单的第一次成交，成交笔数按有成交的订单计算
+        """
+        value = volume * price
+        if order_type == "buy":
+            self.commission += value * self.cost
+        elif order_type == "sell":
+            self.commission += value * (self.cost + self.tax)
+        self.turnover += volume
+        if first:
+            self.trade_count += 1
+
+    def on_pos_profit(self, old, new):
+        """
+        持仓记录盈亏变化
+        :param old: 修改前的盈亏，新建持仓记录时为None
+        :param new: 修改后的盈亏
+        """
+        if old is not None and not math.isnan(old):
+            self.pos_num -= 1
+            self.profit_sum -= old
+            self.profit_sqsum -= old * old
+            if old > 0:
+                self.win_num -= 1
+            else:
+                self.loss_num -= 1
+
+        if new is not None and not math.isnan(new):
+            self.pos_num += 1
+            self.profit_sum += new
+            self.profit_sqsum += new * new
+            if new > 0:
+                self.win_num += 1
+            else:
+                self.loss_num += 1
+
+    def statistics(self):
+        """计算交易结果报表"""
+        n = self.pos_num
+        return_mean = self.profit_sum / n if n else 0
+        return_std = 0
+        if n > 1:
+            return_std = math.sqrt(max((self.profit_sqsum - self.profit_sum * self.profit_sum / n) / (n - 1), 0))
+
+        if return_std:
+            sharpe_ratio = float(return_mean / return_std * np.sqrt(ANNUAL_DAYS))
+        else:
+            sharpe_ratio = 0
+
+        total_return = round(((self.end_balance / self.capital - 1) * 100), 2) if self.capital else 0
+        win_lose = self.win_num + self.loss_num
+
+        return {
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+            "total_days": self.total_days,
+            "profit_days": self.profit_days,
+            "loss_days": self.loss_days,
+            "captial": self.capital,
+            "end_balance": self.end_balance,
+            "max_drawdown": self.max_drawdown,
+            "max_ddpercent": round((self.max_drawdown / self.peak) * 100, 2) if self.peak else 0,
+            "total_net_pnl": round((self.end_balance - self.capital), 2),
+            "total_commission": self.commission,
+            "total_slippage": 0,
+            "total_turnover": self.turnover,
+            "total_trade_count": self.trade_count,
+            "win_num": self.win_num,
+            "loss_num": self.loss_num,
+            "win_rate": round((self.win_num / win_lose * 100), 2) if win_lose else 0,
+            "total_return": total_return,
+            "annual_return": round((total_return / self.total_days * ANNUAL_DAYS), 2) if self.total_days else 0,
+            "daily_return": return_mean,
+            "return_std": return_std,
+            "sharpe_ratio": sharpe_ratio,
+        }
+
+
+def build_report(capital: float, cost: float, tax: float,
+                 account_records: list, pos_records: list, orders: list):
+    """由历史记录计算交易结果报表"""
+    return ReportAccumulator.from_records(capital, cost, tax, account_records, pos_records, orders).statistics()
+
+
+def filter_records(account_records: list, pos_records: list, orders: list, start: str = None, end: str = None):
+    """按日期范围过滤计算报表需要的记录"""
+    if start:
+        account_records = [r for r in account_records if r['check_date'] >= start]
+        pos_records = [r for r in pos_records if r['first_buy_date'] >= start]
+        orders = [o for o in orders if o['order_date'] >= start]
+    if end:
+        account_records = [r for r in account_records if r['check_date'] <= end]
+        pos_records = [r for r in pos_records if r['last_sell_date'] <= end]
+        orders = [o for o in orders if o['order_date'] <= end]
+
+    return account_records, pos_records, orders
+
+
+"""批量报表"""
+
+
+# 报表进程的数据库连接
+_db = None
+
+# 报表进程池，第一次批量计算时创建，之后的请求共用
+_pool = None
+_pool_lock = Lock()
+
+
+def init_report_worker(settings: dict):
+    """报表进程初始化，每个进程使用独立的数据库连接"""
+    global _db
+    SETTINGS.update(settings)
+    _db = MongoDBService(SETTINGS['MONGO_HOST'], SETTINGS['MONGO_PORT'])
+    _db.connect_db()
+
+
+def storage_report(token: str, start: str = None, end: str = None, db=None):
+    """
+    由数据库中的数据计算账户报表
+    :return: 报表字典，包含account_id，计算失败时包含error
+    """
+    db = db or _db
+    try:
+        account = query_account_one(token, db)
+        if not account:
+            return {"account_id": token, "error": "账户不存在"}
+
+        flt = {'traded': {'$gt': 0}}
+        records = filter_records(
+            query_account_record(token, db, start, end) or [],
+            query_pos_records(token, db) or [],
+            query_orders(token, db, flt) or [],
+            start,
+            end
+        )
+        report = {"account_id": token}
+        report.update(build_report(account['capital'], account['cost'], account['tax'], *records))
+        return report
+    except Exception:
+        return {"account_id": token, "error": traceback.format_exc(limit=1)}
+
+
+def get_report_pool():
+    """
+    获取报表进程池
+    进程启动及连接数据库的开销较大，进程池只创建一次，进程异常退出后重新创建
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=SETTINGS['REPORT_WORKERS'],
+                                        mp_context=get_context("spawn"),
+                                        initializer=init_report_worker,
+                                        initargs=(dict(SETTINGS),))
+        return _pool
+
+
+def close_report_pool():
+    """关闭报表进程池"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+
+
+def batch_report(tokens: list, start: str = None, end: str = None):
+    """
+    多进程批量计算账户报表
+    每个进程直接从数据库读取账户数据，统计口径与单个账户的报表一致，
+    多个请求共用同一个进程池
+    :return: 与tokens顺序一致的报表列表
+    """
+    global _pool
+    if not tokens:
+        return []
+
+    chunksize = max(1, len(tokens) // (SETTINGS['REPORT_WORKERS'] * 4))
+    pool = get_report_pool()
+    try:
+        return list(pool.map(storage_report, tokens, repeat(start), repeat(end), chunksize=chunksize))
+    except BrokenProcessPool:
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        raise
@@ -0,0 +1,150 @@
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, time
+
+from paper_trading.trade.data_center import get_trade_days
+
+
+# 默认交易时段
+SESSIONS = [(time(9, 15), time(11, 30)), (time(13, 0), time(15, 0))]
+
+
+def load_trade_days(db):
+    """从数据库读取交易日，读取失败时返回空列表"""
+    try:
+        return get_trade_days(db)
+    except Exception:
+        return []
+
+
+def seconds_of_day(t: time):
+    """时间转换为当日的秒数"""
+    return t.hour * 3600 + t.minute * 60 + t.second + t.microsecond / 1000000
+
+
+class TradingCalendar:
+    """
+    交易日历
+    交易日及交易时段在初始化时转换为排序的数组，查询时使用二分查找，不需要网络请求；
+    没有交易日数据或日期超出数据范围时，以周一至周五作为交易日
+    """
+
+    def __init__(self, trade_days: list = None, sessions: list = None):
+        """
+        构造函数
+        :param trade_days: 交易日列表，格式为YYYYMMDD
+        :param sessions: 交易时段列表[(开始时间, 结束时间)]，最后一个时段的结束时间为收盘时间
+        """
+        self.trade_days = sorted(set(trade_days or []))     # 排序的交易日
+        self.sessions = sessions or SESSIONS                # 交易时段
+        self.close_time = self.sessions[-1][1]              # 收盘时间
+
+        # 交易时段的边界，按[开始, 结束, 开始, 结束...]排列的当日秒数
+        self.bounds = list()
+        for start, end in self.sessions:
+            self.bounds.extend([seconds_of_day(start), seconds_of_day(end)])
+
+    @classmethod
+    def load(cls, db):
+        """从数据库加载交易日历，数据库中没有数据时使用周一至周五作为交易日"""
+        return cls(load_trade_days(db))
+
+    def reload(self, db):
+        """
+        重新从数据库加载交易日，直接更新当前实例，交易市场及行情引擎持有的日历同时生效
+        :return: 是否加载到交易日数据
+        """
+        trade_days = load_trade_days(db)
+        if trade_days:
+            self.trade_days = sorted(set(trade_days))
+
+        return bool(trade_days)
+
+    def in_range(self, date: str):
+        """日期是否在交易日数据范围内"""
+        return bool(self.trade_days) and self.trade_days[0] <= date <= self.trade_days[-1]
+
+    def is_trade_date(self, date: str = None):
+        """
+        是否为交易日
+        :param date: 日期，格式为YYYYMMDD，默认为当天
+        """
+        date = date or datetime.now().strftime("%Y%m%d")
+        if self.in_range(date):
+            i = bisect_left(self.trade_days, date)
+            return i < len(self.trade_days) and self.trade_days[i] == date
+
+        return datetime.strptime(date, "%Y%m%d").weekday() < 5
+
+    def next_trade_date(self, date: str):
+        """下一个交易日，不包含当日"""
+        if self.in_range(date):
+            i = bisect_right(self.trade_days, date)
+            if i < len(self.trade_days):
+                return self.trade_days[i]
+
+        d = datetime.strptime(date, "%Y%m%d")
+        while True:
+            d += timedelta(days=1)
+            next_date = d.strftime("%Y%m%d")
+            if self.is_trade_date(next_date):
+                return next_date
+
+    def prev_trade_date(self, date: str):
+        """上一个交易日，不包含当日"""
+        if self.in_range(date):
+            i = bisect_left(self.trade_days, date)
+            if i > 0:
+                return self.trade_days[i - 1]
+
+        d = datetime.strptime(date, "%Y%m%d")
+        while True:
+            d -= timedelta(days=1)
+            prev_date = d.strftime("%Y%m%d")
+            if self.is_trade_date(prev_date):
+                return prev_date
+
+    def is_open(self, now: datetime = None):
+        """当前是否在交易时段内"""
+        return self.session_wait(now or datetime.now()) == 0
+
+    def is_closed(self, now: datetime):
+        """当日是否为交易日且已收盘"""
+        return now.time() >= self.close_time and self.is_trade_date(now.strftime("%Y%m%d"))
+
+    def session_wait(self, now: datetime):
+        """
+        距离下一个交易时段开始的秒数
+        :return: 交易时段内返回0
+        """
+        date = now.strftime("%Y%m%d")
+        if self.is_trade_date(date):
+            # 奇数位置表示在交易时段内，交易时段的结束时间包含在时段内
+            seconds = seconds_of_day(now.time())
+            i = bisect_left(self.bounds, seconds)
+            if i % 2:
+                return 0
+            if i < len(self.bounds):
+                if self.bounds[i] == seconds:
+                    return 0
+                return self.bounds[i] - seconds
+
+        # 当日没有剩余的交易时段，等待到下一个交易日开盘
+        next_date = datetime.strptime(self.next_trade_date(date), "%Y%m%d")
+        open_time = datetime.combine(next_date.date(), self.sessions[0][0])
+        return (open_time - now).total_seconds()
+
+    def session_remain(self, now: datetime):
+        """距离当前交易时段结束的秒数，不在交易时段内时返回0"""
+        if not self.is_trade_date(now.strftime("%Y%m%d")):
+            return 0
+
+        seconds = seconds_of_day(now.time())
+        i = bisect_left(self.bounds, seconds)
+        if i % 2:
+            return self.bounds[i] - seconds
+        if i < len(self.bounds) and self.bounds[i] == seconds:
+            # 恰好在交易时段开始时间
+            return self.bounds[i + 1] - seconds
+
+        return 0
@@ -26,7 +26,11 @@ EVENT_POS_RECORD_INSERT = "e_p_r_i"             # 持仓记录修改事件
 EVENT_POS_RECORD_BUY = "e_p_r_b"                # 持仓记录修改事件
 EVENT_POS_RECORD_SELL = "e_p_r_s"               # 持仓记录修改事件
 EVENT_POS_RECORD_CLEAR = "e_p_r_c"              # 持仓记录清理事件
+EVENT_TICK = "e_tick"                           # 行情快照事件
 
-
-
-
+# 推送给客户端的事件
+PUSH_EVENTS = (
+    EVENT_ORDER_UPDATE,
+    EVENT_ORDER_STATUS_UPDATE,
+    EVENT_ACCOUNT_UPDATE
+)
@@ -6,6 +6,25 @@ from dataclasses import dataclass
 from paper_trading.utility.constant import Status
 
 
+class FrozenDict(dict):
+    """只读字典，用于对外发布的数据快照"""
+
+    def __readonly(self, *args, **kwargs):
+        raise TypeError("数据快照不可修改")
+
+    __setitem__ = __delitem__ = __readonly
+    clear = pop = popitem = setdefault = update = __readonly
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
 @dataclass
 class BaseData(object):
     """
@@ -115,3 +134,27 @@ class Order(BaseData):
     def __post_init__(self):
         """"""
         self.pt_symbol = f"{self.code}.{self.exchange}"
+
+
+@dataclass
+class Tick(BaseData):
+    """行情快照数据类"""
+    code: str
+    exchange: str
+    price: float = 0                # 最新价格
+    last_close: float = 0           # 昨日收盘价
+    open: float = 0                 # 开盘价
+    high: float = 0                 # 最高价
+    low: float = 0                  # 最低价
+    volume: float = 0               # 成交量
+    amount: float = 0               # 成交额
+    ask: list = None                # 卖一至卖五价格
+    ask_volume: list = None         # 卖一至卖五数量
+    bid: list = None                # 买一至买五价格
+    bid_volume: list = None         # 买一至买五数量
+    tick_time: str = ""             # 行情时间
+
+    def __post_init__(self):
+        """"""
+        self.pt_symbol = f"{self.code}.{self.exchange}"
+
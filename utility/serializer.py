@@ -0,0 +1,85 @@
+
+import json
+import math
+from enum import Enum
+from datetime import datetime, date
+from dataclasses import is_dataclass
+
+import numpy as np
+
+from paper_trading.utility.setting import SETTINGS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def default(obj):
+    """标准库无法直接序列化的类型"""
+    if is_dataclass(obj):
+        return obj.__dict__
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"无法序列化的数据类型：{type(obj).__name__}")
+
+
+def finite(obj):
+    """将NaN及正负无穷替换为None，与orjson的输出一致"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: finite(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [finite(v) for v in obj]
+    if obj is None or isinstance(obj, (str, int)):
+        return obj
+    return finite(default(obj))
+
+
+def json_dumps(obj) -> bytes:
+    """
+    使用标准库json序列化
+    标准库会输出不符合json规范的NaN、Infinity，数据中包含这些值时先替换为null
+    """
+    try:
+        s = json.dumps(obj, ensure_ascii=False, default=default, allow_nan=False)
+    except ValueError:
+        s = json.dumps(finite(obj), ensure_ascii=False, default=default, allow_nan=False)
+    return s.encode("utf-8")
+
+
+def orjson_dumps(obj) -> bytes:
+    """使用orjson序列化，原生支持dataclass及numpy数组"""
+    return orjson.dumps(obj, default=default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def get_dumps():
+    """
+    根据配置选择序列化函数
+    auto时优先使用orjson，未安装时使用标准库json
+    """
+    name = SETTINGS.get('JSON_SERIALIZER', "auto")
+    if name == "json":
+        return json_dumps
+    if orjson is None:
+        if name == "orjson":
+            raise ImportError("未安装orjson：pip install orjson")
+        return json_dumps
+
+    return orjson_dumps
+
+
+def dumps(obj) -> bytes:
+    """序列化为json字节串"""
+    return get_dumps()(obj)
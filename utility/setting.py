@@ -14,7 +14,8 @@ SETTINGS = {
     "POINT": 2,
 
     # 是否开启成交量计算模拟
-    # TODO 暂时没有实现相关功能
+    # 开启后按一至五档盘口逐档消耗可成交数量，成交价格为各档成交的加权均价，
+    # 盘口数量不足时订单部分成交，剩余部分继续挂单；同一行情快照中已成交的数量不会被再次成交
     "VOLUME_SIMULATION": False,
 
     # 是否开启账户与持仓信息的验证
@@ -24,6 +25,63 @@ SETTINGS = {
     # 设置此参数时请参考行情的刷新速度
     "PERIOD": 3,
 
+    # 是否开启行情驱动撮合
+    # 开启后由行情引擎按固定间隔批量查询有挂单的证券及证券池的行情，
+    # 交易市场收到行情快照后只撮合该证券的订单
+    "TICK_MATCHING": False,
+    "TICK_PERIOD": 3,       # 行情查询间隔（秒）
+    "TICK_UNIVERSE": [],    # 证券池，没有挂单时也查询行情的证券代码列表
+
+    # 行情录制与回放
+    # 开启录制后查询到的所有行情快照按交易日及证券写入QUOTE_DIR中的行情文件
+    # QUOTE_REPLAY设置为交易日（YYYYMMDD）时使用该日录制的行情代替实时行情，交易市场使用回放时钟
+    "QUOTE_RECORD": False,
+    "QUOTE_DIR": "quotes",
+    "QUOTE_REPLAY": "",
+    "REPLAY_SPEED": 1,      # 回放倍速
+
+    # 账户分片进程数量
+    # 大于1时账户按token哈希分配到多个工作进程中处理，不同账户的成交可以并行计算
+    # 0或1时所有账户在主进程中处理，最多99个分片（订单编号中的进程编号为两位）
+    "ACCOUNT_SHARDS": 0,
+
+    # 是否以Actor模式运行交易员
+    # 开启后交易员的所有修改操作以消息形式放入邮箱，由工作线程池批量处理
+    "ACCOUNT_ACTOR": False,
+    "ACTOR_WORKERS": 4,     # Actor工作线程数量
+    "ACTOR_BATCH": 100,     # 每次处理的最大消息数量
+
+    # 收盘清算的工作线程数量
+    # 各账户并行清算，清算结果按账户批量持久化
+    "LIQ_WORKERS": 8,
+
+    # 是否开启订单推送服务
+    # 开启后客户端可以通过/stream接口订阅账户的订单状态、成交及账户资金变化
+    "PUSH_ACTIVE": False,
+    "PUSH_QUEUE_SIZE": 1000,    # 每个订阅者最多缓存的消息数量，超出后丢弃最早的消息
+    "PUSH_HEARTBEAT": 15,       # 心跳间隔（秒）
+
+    # 是否开启订单网关
+    # 开启后在TCP或Unix socket上提供长连接的订单接收通道，同时开启推送服务
+    "GATEWAY_ACTIVE": False,
+    "GATEWAY_HOST": "0.0.0.0",
+    "GATEWAY_PORT": 5100,
+    "GATEWAY_UNIX_PATH": "",    # 不为空时使用Unix socket
+    "GATEWAY_BATCH": 500,       # 每次批量处理的最大消息数量
+    "GATEWAY_MAX_FRAME": 1048576,   # 单条消息的最大长度（字节），超出时关闭连接
+
+    # 批量计算账户报表的进程数量
+    "REPORT_WORKERS": 4,
+
+    # 接口响应的json序列化方式
+    # auto：安装了orjson时使用orjson，否则使用标准库json
+    # orjson：使用orjson
+    # json：使用标准库json
+    "JSON_SERIALIZER": "auto",
+
+    # 账户查询响应缓存的最大条目数，超出后淘汰最久未使用的条目
+    "RESPONSE_CACHE_SIZE": 10000,
+
     # 数据持久化模式
     # 实时持久化，会大幅降低整个模拟交易程序的执行效率，建议在手工交易时使用
     # 定时持久化，系统会在指定的时间间隔进行自动持久化，时间间隔越低，效率越低，建议进行低频程序化交易时使用
@@ -43,6 +101,15 @@ SETTINGS = {
     "ACCOUNT_RECORD": "pt_acc_record",
     "POS_RECORD": "pt_pos_record",
 
+    # 批量加载账户数据时每次联合查询的账户数量
+    "BULK_LOAD_SIZE": 200,
+
+    # 订单分页查询的默认及最大数量
+    "PAGE_SIZE": 1000,
+    "MAX_PAGE_SIZE": 10000,
+    # 订单导出时每批从数据库读取的数量
+    "EXPORT_BATCH_SIZE": 1000,
+
     # tushare行情源参数(填写你自己的tushare token，可以前往https://tushare.pro/ 注册申请)
     "TUSHARE_TOKEN": "",
 
@@ -0,0 +1,42 @@
+"""
+交易结果统计指标
+服务端报表与客户端PaperTrading.data_statistics共用的统计口径
+"""
+
+import numpy as np
+
+
+# 年化使用的交易日数量
+ANNUAL_DAYS = 240
+
+
+def commission_cal(trade_df, cost: float, tax: float):
+    """
+    计算每笔成交的手续费，买入收取佣金，卖出收取佣金和印花税
+    :return: ndarray
+    """
+    value = trade_df['traded'].values * trade_df['trade_price'].values
+    order_type = trade_df['order_type'].values
+    return np.where(order_type == "buy", value * cost,
+                    np.where(order_type == "sell", value * (cost + tax), 0.))
+
+
+def max_drawdown_cal(assets):
+    """
+    最大回撤计算
+    回撤区间从资产创新高开始，到资产重新回到前高结束，尚未恢复的回撤区间不计算在内
+    :param assets: 逐日资产序列
+    """
+    assets = np.asarray(assets, dtype=float)
+    if not len(assets):
+        return 0
+
+    peak = np.maximum.accumulate(assets)
+    underwater = assets < peak
+    # 每次回到前高开始一个新的区间，最后一个区间没有恢复
+    group = np.cumsum(~underwater)
+    closed = underwater & (group < group[-1])
+    if not closed.any():
+        return 0
+
+    return float((peak - assets)[closed].max())